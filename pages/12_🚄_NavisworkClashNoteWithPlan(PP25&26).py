@@ -1,34 +1,24 @@
 import streamlit as st
 import pandas as pd
-from reportlab.platypus import Table, Image, Spacer, Paragraph, PageTemplate, Frame, BaseDocTemplate
 from reportlab.lib import colors
-from reportlab.lib.pagesizes import landscape, A3
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_LEFT
 from reportlab.lib.units import inch
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle, Frame, 
-                                PageTemplate, BaseDocTemplate, Image as ReportlabImage, 
-                                Paragraph, Spacer)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from PIL import Image as pil_image
 import xml.etree.ElementTree as ET
-import zipfile
 import time
 from io import BytesIO
-import os
-import shutil
-import tempfile
-from bs4 import BeautifulSoup
-from PIL import Image as PIL_Image
+from utils.navisworks_html import read_view_records
+from utils.view_names import split_view_names
+from utils.hashing import file_digest
+from utils.dates import parse_dates
+from utils.clash_pipeline import EditLog, FilterIndex, SessionPipeline, collect_images, refresh_images, resolve_images, uploads_key
+from utils.pdf_layout import A4_NOTE, A3_PLAN, ImageSlot, build_table_pdf, build_details_pdf, register_fonts
+from utils.report_jobs import submit_report
+from utils.text_search import SEARCH_COLUMNS, TextIndex
+from utils.report_ui import clash_grid, filter_controls, report_quality_controls, show_report_job
 import datetime
 
-EXTRACTED_FLAG = False
+VIEW_NAME_SCHEMA = "Clash ID_Date Found_Main Zone_Sub Zone_Level_Discipline_Description_Issues Type"
+# Image columns and the columns their file names are kept in
+IMAGE_COLUMNS = {"Image": "ImageName", "Image_Plan": "Image_Plan_Name", "Image_Section": "Image_Section_Name"}
 
 st.set_page_config(page_title='Naviswork Clash Issues Report & Note (PP)', page_icon=":station:", layout='centered')
 
@@ -36,21 +26,11 @@ css_file = "styles/main.css"
 with open(css_file) as f:
     st.markdown("<style>{}</style>".format(f.read()), unsafe_allow_html=True)
 
-pdfmetrics.registerFont(TTFont('Sarabun', r'./Font/THSarabunNew.ttf'))
-pdfmetrics.registerFont(TTFont('Sarabun-Bold', r'./Font/THSarabunNew Bold.ttf'))
-
-def adjust_convert_date_format(date_str):
-    # Check if the date is already in 'YYYY-MM-DD' format
-    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
-        return date_str
-    # Adjusted function to handle the date format 'YYMMDD'
-    try:
-        formatted_date = "20" + date_str[:2] + "-" + date_str[2:4] + "-" + date_str[4:6]
-        return formatted_date  # We already have it in 'YYYY-MM-DD' format, so no need for extra conversion
-    except:
-        return None
-
-
+register_fonts()
+report_quality, report_max_mb = report_quality_controls()
+pipeline = SessionPipeline(st.session_state.setdefault(f"{__file__}:pipeline", {}))
+# What was typed into the working table, so it survives the table being rebuilt
+edit_log = EditLog(st.session_state.setdefault(f"{__file__}:edit log", {}))
 
 def extract_grid_value(view_name):
     """Extract the grid value from the view name."""
@@ -59,19 +39,9 @@ def extract_grid_value(view_name):
         return parts[2]
     return None
 
-def process_html_to_dfs(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    h2_tags = soup.find_all('h2')
-    data = []
-
-    for h2 in h2_tags:
-        view_name = h2.text.strip()
-        img = h2.find_next('img')
-        img_src = img['src'].split('/')[-1] if img else None  # Extract just the filename from the src
-        clash_id = view_name.split('_')[0]  # Extract the Clash ID by splitting the view name on underscore
-        data.append((clash_id, view_name, img_src))
-
-    full_df = pd.DataFrame(data, columns=['Clash ID', 'View Name', 'Image'])
+def process_html_to_dfs(view_records):
+    full_df = view_records.copy()
+    full_df.insert(0, 'Clash ID', full_df['View Name'].str.split('_').str[0])  # Extract the Clash ID by splitting the view name on underscore
     
     # Filter the rows based on the view name patterns
     df1 = full_df[full_df['View Name'].str.contains("_View \(Plan\)")]
@@ -82,38 +52,17 @@ def process_html_to_dfs(html_content):
 
     return df1, df2
 
-def process_html_content(html_content):
-    df1, df2 = process_html_to_dfs(html_content)
+def process_html_content(html_source):
+    view_records = read_view_records(html_source)
+    df1, df2 = process_html_to_dfs(view_records)
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-    h2_tags = soup.find_all('h2')
-    data = []
-
-    for h2 in h2_tags:
-        img = h2.find_next('img')
-        img_src = img['src'].split('/')[-1] if img else None  # Extract just the filename from the src
-        data.append((h2.text.strip(), img_src))
-
-    df = pd.DataFrame(data, columns=['View Name', 'Image'])
-    multiple_underscores_df = df[df['View Name'].str.count('_') > 2]
-    filtered_no_asterisk_df = multiple_underscores_df[~multiple_underscores_df['View Name'].str.contains('\*')]
-    
-    split_columns = filtered_no_asterisk_df['View Name'].str.split('_', expand=True)
-    renamed_columns = {
-        0: "Clash ID",
-        1: "Date Found",
-        2: "Main Zone",
-        3: "Sub Zone",
-        4: "Level",
-        5: "Discipline",
-        6: "Description",
-        7: "Issues Type"
-    }
-    split_columns = split_columns.rename(columns=renamed_columns)
-    expanded_df = pd.concat([filtered_no_asterisk_df, split_columns], axis=1)
+    df = view_records
+    fields, malformed_view_names = split_view_names(df['View Name'], VIEW_NAME_SCHEMA)
+    expanded_df = df.loc[fields.index].join(fields)
 
     if 'Date Found' in expanded_df.columns:
-        expanded_df['Formatted Date'] = expanded_df['Date Found'].apply(adjust_convert_date_format)
+        expanded_df['Formatted Date'], invalid_dates = parse_dates(expanded_df['Date Found'])
+        malformed_view_names = pd.concat([malformed_view_names, expanded_df.loc[invalid_dates, 'View Name']])
     else:
         expanded_df['Formatted Date'] = None
 
@@ -144,7 +93,7 @@ def process_html_content(html_content):
     final_merged_df = pd.merge(merged_df, df2[['Clash ID', 'Grid']], on='Clash ID', how='left')
     final_merged_df_filtered = final_merged_df.dropna(subset=['Date Found'])
 
-    return final_merged_df_filtered
+    return final_merged_df_filtered, malformed_view_names
 
 
 
@@ -176,384 +125,63 @@ def process_xml_content(xml_content):
     return filtered_df
     
 
-def extract_images_from_zip(uploaded_zip_file):
-    extracted_images = []
-    
-    # Create a temporary directory to extract files into
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Save the uploaded file to a temporary file
-        temp_zip_path = os.path.join(tmpdirname, 'temp.zip')
-        with open(temp_zip_path, 'wb') as f:
-            f.write(uploaded_zip_file.getvalue())
-        
-        # Extract the zip file
-        shutil.unpack_archive(temp_zip_path, tmpdirname)
-
-        # Walk through the extracted files and pick up images
-        for subdir, _, files in os.walk(tmpdirname):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(subdir, file)
-                    with open(file_path, 'rb') as f:
-                        extracted_images.append((file, f.read()))
-
-    return extracted_images
-
-DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y"]
-def try_parsing_date(text):
-    for fmt in DATE_FORMATS:
-        try:
-            return pd.to_datetime(text, format=fmt).strftime("%m/%d/%Y")
-        except ValueError:
-            pass
-    # If all formats fail, return the original string
-    return text
-
-
-def generate_pdf(df, project_name):
-    class MyDocTemplate(BaseDocTemplate):
-        def __init__(self, filename, **kwargs):
-            BaseDocTemplate.__init__(self, filename, **kwargs)
-            page_width, page_height = landscape(A3)
-            frame_width = page_width - 2*0.7*inch
-            frame_height = page_height - 2*0.7*inch
-            frame = Frame(0.7*inch, 0.7*inch, frame_width, frame_height, id='F1')
-            template = PageTemplate('normal', [frame], onPage=self.add_page_decorations)
-            self.addPageTemplates([template])
-
-        def add_page_decorations(self, canvas, doc):
-            with pil_image.open(logo_path) as img:
-                width, height = img.size
-            aspect = width / height
-            new_height = 0.25 * inch
-            new_width = new_height * aspect
-
-            canvas.drawImage(logo_path, 0.2*inch, doc.height + 1.5*inch, width=new_width, height=new_height)
-
-            canvas.setFont("Sarabun-Bold", 30)
-            canvas.drawCentredString(doc.width/2 + 0.5*inch, doc.height + 1.2*inch + 0.25*inch, project_name)
-
-            timestamp = time.strftime("%Y/%m/%d %H:%M:%S")
-            canvas.setFont("Sarabun-Bold", 10)
-            canvas.drawRightString(doc.width + inch, doc.height + inch + 0.75*inch, f"Generated on: {timestamp}")
-
-    logo_path = r"./Media/1-Aurecon-logo-colour-RGB-Positive.png"
-
-    output = BytesIO()
-    pdf = MyDocTemplate(output, pagesize=landscape(A3))
-
-    styles = getSampleStyleSheet()
-    cell_style = styles["Normal"]
-    cell_style.fontName = "Sarabun"
-    cell_style.alignment = TA_LEFT
-
-    content = []
-
-    header_style = ParagraphStyle(
-        "HeaderStyle",
-        parent=styles["Normal"],
-        fontName="Sarabun-Bold",
-        fontSize=18,
-        textColor=colors.white,
-        alignment=TA_LEFT,
-        spaceAfter=12,
-        leftIndent=6,
-        leading=16,
-    )
 
-    table_style = [
-        ('BACKGROUND', (0, 0), (-1, 0), colors.purple),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTNAME', (0, 0), (-1, -1), 'Sarabun'),
-        ('FONTSIZE', (0, 0), (-1, 0), 16),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('STYLE', (0, 0), (-1, -1), cell_style),
-    ]
-
-    header_data = [Paragraph(cell, header_style) for cell in df.columns.tolist()]
-    column_order = ["Clash ID", "Image", "View Name", "Date Found", "Main Zone", "Sub Zone", "Level",
-                    "Issues Type", "Issues Status", "Description", "Discipline"]
-    header_data_reordered = [header_data[df.columns.get_loc(col)] for col in column_order]
-    content = []
-
-    for _, row in df.iterrows():
-        img_data = row['Image']
-        if img_data != "Image not found":
-            if isinstance(img_data, BytesIO):  # If it's already a BytesIO object
-                image_stream = img_data
-            else:
-                image_stream = BytesIO(img_data.getvalue())
-            img_data.seek(0)  # Reset the file pointer
-            img = Image(image_stream, width=150, height=150)
-        else:
-            img = 'Image not found'
-
-        row_data = [
-            Paragraph(str(row["Clash ID"]), cell_style),
-            img,
-            Paragraph(str(row["View Name"]), cell_style),
-            Paragraph(str(row["Date Found"]), cell_style),
-            Paragraph(str(row["Main Zone"]), cell_style),
-            Paragraph(str(row["Sub Zone"]), cell_style),
-            Paragraph(str(row["Level"]), cell_style),
-            Paragraph(str(row["Issues Type"]), cell_style),
-            Paragraph(str(row["Issues Status"]), cell_style),
-            Paragraph(str(row["Description"]), cell_style),
-            Paragraph(str(row["Discipline"]), cell_style),
-            
-        ]
-        content.append(row_data)
-
-    data = [header_data_reordered] + content
-    col_widths = [100, 170, 80, 80, 80, 80, 80, 80, 80, 90, 80]
-    table = Table(data, colWidths=col_widths, repeatRows=1, style=table_style)
-    elems = [table]
-    pdf.build(elems)
-    output.seek(0)
-    return output
-
-pdfmetrics.registerFont(TTFont('Sarabun', r'./Font/THSarabunNew.ttf'))
-pdfmetrics.registerFont(TTFont('Sarabun-Bold', r'./Font/THSarabunNew Bold.ttf'))
-
-def formatted_paragraph(text, styles):
-    bold_style = ParagraphStyle("BoldStyle", parent=styles["Normal"], fontName="Sarabun-Bold")
-    light_style = ParagraphStyle("LightStyle", parent=styles["Normal"], fontName="Sarabun")
-
-    # Split the text into bold and light parts using the custom tags
-    parts = text.split("<l>")
-    bold_text = parts[0].replace("<b>", "").replace("</b>", "").strip()
-    light_text = parts[1].replace("</l>", "").strip()
-
-    # Create Paragraph objects for each part
-    bold_part = Paragraph(bold_text, style=bold_style)
-    light_part = Paragraph(light_text, style=light_style)
-
-    return bold_part, light_part
-
-
-def generate_pdf2(df, project_name):
-    class MyDocTemplate(BaseDocTemplate):
-        def __init__(self, filename, **kwargs):
-            BaseDocTemplate.__init__(self, filename, **kwargs)
-            page_width, page_height = A4
-            frame_width = page_width
-            frame_height = 0.8 * page_height
-            frame_x = (page_width - frame_width) / 2
-            frame_y = (page_height - frame_height) / 2
-            frame = Frame(frame_x, frame_y, frame_width, frame_height, id='F1')
-            template = PageTemplate('normal', [frame], onPage=self.add_page_decorations)
-            self.addPageTemplates([template])
-        def add_page_decorations(self, canvas, doc):
-            with pil_image.open(logo_path) as img:
-                width, height = img.size
-            aspect = width / height
-            new_height = 0.25 * inch
-            new_width = new_height * aspect
-            canvas.drawImage(logo_path, 0.2*inch, doc.height + 1.5*inch, width=new_width, height=new_height)
-            canvas.setFont("Sarabun-Bold", 26)
-            # Adjusting the Y position (doc.height + ...) to a smaller value will lower the project name
-            canvas.drawCentredString(page_width/2, doc.height + 1.0*inch, project_name)
-            timestamp = time.strftime("%Y/%m/%d")
-            canvas.setFont("Sarabun-Bold", 10)
-            canvas.drawRightString(page_width - 0.2*inch, page_height - 0.2*inch, f"Generated on: {timestamp}")
-
-    logo_path = r"./Media/1-Aurecon-logo-colour-RGB-Positive.png"
-    output = BytesIO()
-    pdf = MyDocTemplate(output, pagesize=A4)
-    story = []
-    header_data = ["No.", "Image", "Details", "Note"]
-    styles = getSampleStyleSheet()
- 
-    data = [header_data]
-    for idx, (index, row) in enumerate(df.iterrows(), 1):
-        img_data = row['Image']
-        if img_data != "Image not found":
-            if isinstance(img_data, BytesIO):  # If it's already a BytesIO object
-                image_stream = img_data
-            else:
-                image_stream = BytesIO(img_data.getvalue())
-            img_data.seek(0)  # Reset the file pointer to the start
-            image_path = ReportlabImage(image_stream, width=2.4*inch, height=2.4*inch)
-        else:
-            image_path = "Image Not Found"
-
-        details_list = []
-        texts = [
-            f"<b>Clash ID:</b> <l>{row['Clash ID']}</l>",
-            f"<b>Date Found:</b> <l>{row['Date Found']}</l>",
-            f"<b>Main Zone:</b> <l>{row['Main Zone']}</l>",
-            f"<b>Sub Zone:</b> <l>{row['Sub Zone']}</l>",
-            f"<b>Level:</b> <l>{row['Level']}</l>",
-            f"<b>Grid:</b> <l>{row['Grid']}</l>",
-            f"<b>Description:</b> <l>{row['Description']}</l>",
-            f"<b>Discipline:</b> <l>{row['Discipline']}</l>",
-            f"<b>Issue Type:</b> <l>{row['Issues Type']}</l>",
-            f"<b>Issue Status:</b> <l>{row['Issues Status']}</l>",
-            f"<b>Due Date:</b> <l>{row['Due Date']}</l>"
-        ]
-        for text in texts:
-            bold_part, light_part = formatted_paragraph(text, styles)
-            details_list.append(bold_part)
-            details_list.append(light_part)
-        details_list.append(Spacer(1, 0.1*inch))
-
-       # new code for note column
-        if row['Notes']:
-            note_lines = row['Notes'].splitlines()
-            light_style = ParagraphStyle("LightStyle", parent=styles["Normal"], fontName="Sarabun")
-            note_paragraphs = [Paragraph(f"{note_lines[0]}", style=light_style)]
-            for line in note_lines[1:]:
-                note_paragraphs.append(Paragraph(f"{line}", style=light_style))
-        else:
-            note_paragraphs = [Spacer(1, 0.1*inch)]  # Use a Spacer instead of plain string
-
-        data.append([str(idx), image_path, details_list, note_paragraphs])
-
-
-    page_width, page_height = A4 
-    col_widths = [(0.05 * page_width), (0.3 * page_width), (0.3* page_width), (0.3* page_width)]
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), '#f0ceff'),
-        ('TEXTCOLOR', (0, 0), (-1, 0), '#333333'),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Sarabun-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 18),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), '#ffffff'),
-        ('GRID', (0, 0), (-1, -1), 1, '#2B2B2B'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Sarabun'),
-        ('FONTSIZE', (1, 1), (1, -1), 16),
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (0, 0), 'Sarabun-Bold'),
-        ('FONTSIZE', (0, 0), (0, -1), 16)
-    ])
-    table = Table(data, colWidths=col_widths, repeatRows=1, style=table_style)
-    story.append(table)
-    pdf.build(story)
-    return output.getvalue()
-
-
-
-
-def generate_pdf3(df, project_name):
-    class MyDocTemplate(BaseDocTemplate):
-        def __init__(self, filename, **kwargs):
-            BaseDocTemplate.__init__(self, filename, **kwargs)
-            page_width, page_height = landscape(A3)
-            frame_width = page_width
-            frame_height = 0.8 * page_height
-            frame_x = (page_width - frame_width) / 2
-            frame_y = (page_height - frame_height) / 2
-            frame = Frame(frame_x, frame_y, frame_width, frame_height, id='F1')
-            template = PageTemplate('normal', [frame], onPage=self.add_page_decorations)
-            self.addPageTemplates([template])
-        def add_page_decorations(self, canvas, doc):
-            with pil_image.open(logo_path) as img:
-                width, height = img.size
-            aspect = width / height
-            new_height = 0.25 * inch
-            new_width = new_height * aspect
-            canvas.drawImage(logo_path, 0.2*inch, doc.height + 1.5*inch, width=new_width, height=new_height)
-            canvas.setFont("Sarabun-Bold", 30)
-            canvas.drawCentredString(doc.width/2 + 0.5*inch, doc.height + 1.0*inch + 0.25*inch, project_name)
-            timestamp = time.strftime("%Y/%m/%d")
-            canvas.setFont("Sarabun-Bold", 10)
-            canvas.drawRightString(page_width - 0.2*inch, page_height - 0.2*inch, f"Generated on: {timestamp}")
-
-    logo_path = r"./Media/1-Aurecon-logo-colour-RGB-Positive.png"
-    output = BytesIO()
-    pdf = MyDocTemplate(output, pagesize=landscape(A3))
-    story = []
-    header_data = ["No.", "Image", "Plan", "Section", "Details", "Note"]
-    styles = getSampleStyleSheet()
- 
-    data = [header_data]
-    for idx, (index, row) in enumerate(df.iterrows(), 1):
-        img_data = row['Image']
-        if img_data != "Image not found":
-            if isinstance(img_data, BytesIO):  # If it's already a BytesIO object
-                image_stream = img_data
-            else:
-                image_stream = BytesIO(img_data.getvalue())
-            img_data.seek(0)  # Reset the file pointer to the start
-            image_path = ReportlabImage(image_stream, width=2.8*inch, height=2.8*inch)
-        else:
-            image_path = "Image Not Found"
-
-        if isinstance(row['Image_Plan'], BytesIO):
-            plan_image_stream = row['Image_Plan']
-            plan_image_path = ReportlabImage(plan_image_stream, width=2.8*inch, height=2.8*inch)
-        else:
-            plan_image_path = "Plan Image Not Found"
+def generate_pdf(df, project_name, quality=None, max_mb=None):
+    return build_table_pdf(
+        df, project_name,
+        columns=["Clash ID", "Image", "View Name", "Date Found", "Main Zone", "Sub Zone", "Level", "Issues Type", "Issues Status", "Description", "Discipline"],
+        col_widths=[100, 170, 80, 80, 80, 80, 80, 80, 80, 90, 80],
+        header_colors=(colors.purple, colors.whitesmoke),
+        quality=quality, max_mb=max_mb,
+    )
 
-        # Handling the Section image
-        if isinstance(row['Image_Section'], BytesIO):
-            section_image_stream = row['Image_Section']
-            section_image_path = ReportlabImage(section_image_stream, width=2.8*inch, height=2.8*inch)
-        else:
-            section_image_path = "Section Image Not Found"
-
-
-        details_list = []
-        texts = [
-            f"<b>Clash ID:</b> <l>{row['Clash ID']}</l>",
-            f"<b>Date Found:</b> <l>{row['Date Found']}</l>",
-            f"<b>Main Zone:</b> <l>{row['Main Zone']}</l>",
-            f"<b>Sub Zone:</b> <l>{row['Sub Zone']}</l>",
-            f"<b>Level:</b> <l>{row['Level']}</l>",
-            f"<b>Grid:</b> <l>{row['Grid']}</l>",
-            f"<b>Description:</b> <l>{row['Description']}</l>",
-            f"<b>Discipline:</b> <l>{row['Discipline']}</l>",
-            f"<b>Issue Type:</b> <l>{row['Issues Type']}</l>",
-            f"<b>Issue Status:</b> <l>{row['Issues Status']}</l>",
-            f"<b>Due Date:</b> <l>{row['Due Date']}</l>"
-        ]
-        for text in texts:
-            bold_part, light_part = formatted_paragraph(text, styles)
-            details_list.append(bold_part)
-            details_list.append(light_part)
-        details_list.append(Spacer(1, 0.1*inch))
-
-       # new code for note column
-        if row['Notes']:
-            note_lines = row['Notes'].splitlines()
-            light_style = ParagraphStyle("LightStyle", parent=styles["Normal"], fontName="Sarabun")
-            note_paragraphs = [Paragraph(f"{note_lines[0]}", style=light_style)]
-            for line in note_lines[1:]:
-                note_paragraphs.append(Paragraph(f"{line}", style=light_style))
-        else:
-            note_paragraphs = [Spacer(1, 0.1*inch)]  # Use a Spacer instead of plain string
 
-        data.append([str(idx), image_path, plan_image_path, section_image_path, details_list, note_paragraphs])
+def generate_pdf2(df, project_name, quality=None, max_mb=None):
+    return build_details_pdf(
+        df, project_name, A4_NOTE,
+        images=[ImageSlot("Image", "Image")],
+        details=[
+            ("Clash ID", "Clash ID"),
+            ("Date Found", "Date Found"),
+            ("Main Zone", "Main Zone"),
+            ("Sub Zone", "Sub Zone"),
+            ("Level", "Level"),
+            ("Grid", "Grid"),
+            ("Description", "Description"),
+            ("Discipline", "Discipline"),
+            ("Issue Type", "Issues Type"),
+            ("Issue Status", "Issues Status"),
+            ("Due Date", "Due Date"),
+        ],
+        col_widths=[0.05, 0.3, 0.3, 0.3],
+        image_size=2.4*inch,
+        header_colors=('#f0ceff', '#333333'),
+        quality=quality, max_mb=max_mb,
+    )
 
 
-    page_width, page_height = A3 
-    col_widths = [(0.05 * page_width), (0.255 * page_width), (0.255* page_width), (0.255* page_width), (0.2* page_width), (0.35* page_width)]
-    table_style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), '#f0ceff'),
-        ('TEXTCOLOR', (0, 0), (-1, 0), '#333333'),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Sarabun-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 18),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), '#ffffff'),
-        ('GRID', (0, 0), (-1, -1), 1, '#2B2B2B'),
-        ('FONTNAME', (0, 1), (-1, -1), 'Sarabun'),
-        ('FONTSIZE', (1, 1), (1, -1), 16),
-        ('ALIGN', (0, 0), (0, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (0, 0), 'Sarabun-Bold'),
-        ('FONTSIZE', (0, 0), (0, -1), 16)
-    ])
-    table = Table(data, colWidths=col_widths, repeatRows=1, style=table_style)
-    story.append(table)
-    pdf.build(story)
-    return output.getvalue()
+def generate_pdf3(df, project_name, quality=None, max_mb=None):
+    return build_details_pdf(
+        df, project_name, A3_PLAN,
+        images=[ImageSlot("Image", "Image"), ImageSlot("Plan", "Image_Plan", "Plan Image Not Found"), ImageSlot("Section", "Image_Section", "Section Image Not Found")],
+        details=[
+            ("Clash ID", "Clash ID"),
+            ("Date Found", "Date Found"),
+            ("Main Zone", "Main Zone"),
+            ("Sub Zone", "Sub Zone"),
+            ("Level", "Level"),
+            ("Grid", "Grid"),
+            ("Description", "Description"),
+            ("Discipline", "Discipline"),
+            ("Issue Type", "Issues Type"),
+            ("Issue Status", "Issues Status"),
+            ("Due Date", "Due Date"),
+        ],
+        col_widths=[0.05, 0.255, 0.255, 0.255, 0.2, 0.35],
+        image_size=2.8*inch,
+        header_colors=('#f0ceff', '#333333'),
+        quality=quality, max_mb=max_mb,
+    )
 
 
 
@@ -568,27 +196,42 @@ df_view = pd.DataFrame()
 html_file = st.file_uploader("Upload HTML File", type=['html'])
 xml_file = st.file_uploader("Upload XML File", type=['xml'])
     
-if html_file and xml_file:  # Check that both files are uploaded
-    try:
-        html_content = html_file.read().decode('utf-8')
-        df_html = process_html_content(html_content)
-        
-        xml_content = xml_file.read().decode('utf-8')
-        df_xml = process_xml_content(xml_content)
-        
-        # Merge on "View Name"
-        merged_df = pd.merge(df_html.drop(columns="Issues Status"), df_xml, on="View Name", how="left")
-        merged_df = merged_df.rename(columns={"Grid_x": "Grid"}).drop(columns=["Grid_y"])
 
-        # Apply the date formatting function to the entire "Date Found" column of merged_df
-        if "Date Found" in merged_df.columns:
-            merged_df["Date Found"] = merged_df["Date Found"].apply(adjust_convert_date_format)
+@st.cache_data(max_entries=8, show_spinner="Reading Navisworks report...")
+def load_clash_table(html_digest, xml_digest, view_name_schema, _html_file, _xml_file):
+    # Keyed on the SHA-256 of both uploads and the view-name schema, so reruns from
+    # note edits, filters and the page slider reuse the parsed and merged table
+    df_html, malformed_view_names = process_html_content(_html_file)
+
+    xml_content = _xml_file.read().decode('utf-8')
+    df_xml = process_xml_content(xml_content)
+    
+    # Merge on "View Name"
+    merged_df = pd.merge(df_html.drop(columns="Issues Status"), df_xml, on="View Name", how="left")
+    merged_df = merged_df.rename(columns={"Grid_x": "Grid"}).drop(columns=["Grid_y"])
+
+    # Apply the date formatting function to the entire "Date Found" column of merged_df
+    if "Date Found" in merged_df.columns:
+        merged_df["Date Found"] = parse_dates(merged_df["Date Found"])[0].dt.strftime("%Y-%m-%d")
+
+    desired_order = ["Clash ID", "View Name", "Date Found", "Main Zone", "Sub Zone", "Level", 
+        "Issues Type", "Issues Status", "Description", "Discipline", "Image", 
+        "View Name_Plan", "Image_Plan", "View Name_Section", "Image_Section", "Grid"]
+
+    merged_df = merged_df[desired_order]
+
+    return merged_df, malformed_view_names
 
-        desired_order = ["Clash ID", "View Name", "Date Found", "Main Zone", "Sub Zone", "Level", 
-            "Issues Type", "Issues Status", "Description", "Discipline", "Image", 
-            "View Name_Plan", "Image_Plan", "View Name_Section", "Image_Section", "Grid"]
 
-        merged_df = merged_df[desired_order]
+if html_file and xml_file:  # Check that both files are uploaded
+    try:
+        # Hashing the uploads and unpickling the cached table wait until the files change
+        merged_df, malformed_view_names = pipeline.run(
+            'merge', lambda: load_clash_table(file_digest(html_file), file_digest(xml_file), VIEW_NAME_SCHEMA, html_file, xml_file),
+            uploads_key(html_file, xml_file),
+        )
+        if not malformed_view_names.empty:
+            st.warning(f"{len(malformed_view_names)} view names do not follow {VIEW_NAME_SCHEMA}: " + ", ".join(malformed_view_names.head(10)))
         
 
         if not merged_df.empty:
@@ -600,50 +243,46 @@ if html_file and xml_file:  # Check that both files are uploaded
 
 uploaded_files = st.file_uploader("Upload Images or ZIP of Images", type=['jpg', 'jpeg', 'png', 'zip', 'application/x-zip-compressed'], accept_multiple_files=True)
 
-image_dict = {}
+# Uploads are indexed once per change of files, not on every rerun
+image_dict, unsupported_types = pipeline.run('ingest', lambda: collect_images(uploaded_files), uploads_key(uploaded_files))
+for file_type in unsupported_types:
+    st.write(f"Unsupported file type: {file_type}")
 
 
 
-for uploaded_file in uploaded_files:
-    file_type = uploaded_file.type
-    if file_type in ['application/zip', 'application/x-zip-compressed']:
-        extracted_images = extract_images_from_zip(uploaded_file)
-        for img_name, img_data in extracted_images:
-            image_dict[img_name] = BytesIO(img_data)
-    elif file_type in ['image/jpeg', 'image/jpg', 'image/png']:
-        image_dict[uploaded_file.name] = uploaded_file
-    else:
-        st.write(f"Unsupported file type: {file_type}")
+# Keep the file names for display in Streamlit table
+merged_df_display = merged_df
+# Replace the image columns with the actual image objects for processing, once per table and set of uploads
+merged_df = pipeline.run(
+    'images', lambda: resolve_images(merged_df_display, image_dict, IMAGE_COLUMNS),
+    None if merged_df_display.empty else pipeline.version('merge'), pipeline.version('ingest'),
+)
 
+def list_statuses():
+    if not merged_df.empty and "Issues Status" in merged_df.columns:
+        available_statuses = merged_df["Issues Status"].unique().tolist()
+    else:
+        available_statuses = []
+    return available_statuses
 
+table_version = None if merged_df.empty else pipeline.version('images')
+available_statuses = pipeline.run('statuses', list_statuses, table_version)
+selected_statuses = st.multiselect("Select Issues Status for Export:", available_statuses, default=available_statuses)
 
-# Replace the "Image" column with the filenames for display in Streamlit table
-merged_df_display = merged_df.copy()
-# Replace the "Image" column with the actual image objects for processing
-if "Image" in merged_df.columns:
-    merged_df["ImageName"]=merged_df["Image"]
-    merged_df["Image"] = merged_df["Image"].apply(lambda x: image_dict.get(x, "Image not found"))
-    
-    merged_df["Image_Plan_Name"]=merged_df["Image_Plan"]
-    merged_df["Image_Plan"] = merged_df["Image_Plan"].apply(lambda x: image_dict.get(x, "Image not found"))
+def status_filter():
+    if "Issues Status" in merged_df.columns:
+        filtered_df = merged_df[merged_df["Issues Status"].isin(selected_statuses)]
+    else:
+        filtered_df = merged_df
+    if "Issues Status" in merged_df_display.columns:
+        filtered_df_display = merged_df_display[merged_df_display["Issues Status"].isin(selected_statuses)]
+    else:
+        filtered_df_display = merged_df_display
+    return filtered_df, filtered_df_display
 
-    merged_df["Image_Section_Name"]=merged_df["Image_Section"]
-    merged_df["Image_Section"] = merged_df["Image_Section"].apply(lambda x: image_dict.get(x, "Image not found"))
-    
-if not merged_df.empty and "Issues Status" in merged_df.columns:
-    available_statuses = merged_df["Issues Status"].unique().tolist()
-else:
-    available_statuses = []
-selected_statuses = st.multiselect("Select Issues Status for Export:", available_statuses, default=available_statuses)
+# The export rows are only filtered again when the table or the selection changes
+filtered_df, filtered_df_display = pipeline.run('status filter', status_filter, table_version, tuple(selected_statuses))
 
-if "Issues Status" in merged_df.columns:
-    filtered_df = merged_df[merged_df["Issues Status"].isin(selected_statuses)]
-else:
-    filtered_df = merged_df
-if "Issues Status" in merged_df_display.columns:
-    filtered_df_display = merged_df_display[merged_df_display["Issues Status"].isin(selected_statuses)]
-else:
-    filtered_df_display = merged_df_display
 st.table(filtered_df_display.head(3))
 
 
@@ -658,13 +297,14 @@ if st.button("Generate CSV"):
         )
 
 if st.button("Generate Report"):
-    pdf_data = generate_pdf(filtered_df, project_name)
-    st.download_button(
-        label="Download PDF Report",
-        data=pdf_data,
+    st.session_state[f"{__file__}:Generate Report"] = submit_report(
+        generate_pdf, filtered_df, project_name,
+        quality=report_quality, max_mb=report_max_mb,
+        label="Report",
+        total=len(filtered_df),
         file_name=f"{time.strftime('%Y%m%d')}_PDF-Wide-ClashReport_{project_name}.pdf",
-        mime="application/pdf"
-        )
+    )
+show_report_job(f"{__file__}:Generate Report")
        
 
 
@@ -681,111 +321,155 @@ if 'due_dates' not in st.session_state:  # Initialize session state for due date
 
 if selected_option == "Option 1: Display without merging":
     if not merged_df.empty and uploaded_files:
-        if 'df' not in st.session_state:
-            st.session_state.df = merged_df.copy()
-            
-        df = st.session_state.df
-        if 'Notes' not in df.columns:
-            df['Notes'] = ""
-        if 'Usage' not in df.columns:
-            df['Usage'] = "Tracking"
-        if 'Assign' not in df.columns:
-            df['Assign'] = "None"
-
-        df["Notes"].fillna("", inplace=True)
-        df["Usage"].fillna("Tracking", inplace=True)
-        df["Assign"].fillna("", inplace=True)
-        #df["Date Found"] = pd.to_datetime(df["Date Found"]).dt.strftime("%m/%d/%Y")
-        df["Date Found"] = df["Date Found"].apply(try_parsing_date)
-        
+        def working_copy():
+            df = merged_df.copy()
+            if 'Notes' not in df.columns:
+                df['Notes'] = ""
+            if 'Usage' not in df.columns:
+                df['Usage'] = "Tracking"
+            if 'Due Date' not in df.columns:
+                # The grid can edit notes without ever setting a due date, which the reports list
+                df['Due Date'] = None
+            if 'Assign' not in df.columns:
+                df['Assign'] = "None"
+
+            df["Notes"].fillna("", inplace=True)
+            df["Usage"].fillna("Tracking", inplace=True)
+            df["Assign"].fillna("", inplace=True)
+            #df["Date Found"] = pd.to_datetime(df["Date Found"]).dt.strftime("%m/%d/%Y")
+            dates, _ = parse_dates(df["Date Found"])
+            df["Date Found"] = dates.dt.strftime("%m/%d/%Y").where(dates.notna(), df["Date Found"])
+            return edit_log.apply(df)
+
+        # Notes, usage and due dates are edited in place on this copy. A new upload of the report
+        # rebuilds it, with the edits carried over by edit_log; new pictures are only copied in
+        df = pipeline.run('working', working_copy, pipeline.version('merge'))
+        pipeline.run('working images', lambda: refresh_images(df, pipeline.result('images'), IMAGE_COLUMNS),
+                     pipeline.version('working'), pipeline.version('images'))
+
 
         st.sidebar.header("Filter Options")
         filter_cols = ['Clash ID', 'View Name', 'Main Zone', 'Sub Zone', 'Level', 
                     'Issues Type', 'Issues Status', 'Discipline','Usage','Grid']
-        selected_values = {}
-        for col in filter_cols:
-            unique_values = df[col].unique().tolist()
-            selected_values[col] = st.sidebar.selectbox(f'Select {col}', ['All'] + unique_values)
-
-        df_view = df.copy()
-        for col, value in selected_values.items():
-            if value != 'All':
-                df_view = df_view[df_view[col] == value]
+        # Codes and bitsets of the filter columns are built once per table and usage edit;
+        # every filter combination after that is a bitwise AND, and each option shows its row count
+        index = pipeline.run(
+            'filter index', lambda: FilterIndex(df, filter_cols),
+            pipeline.version('working'), pipeline.version('edits'),
+        )
+        selected_values = filter_controls(index, f"{__file__}:filters")
+        query = st.sidebar.text_input("Search view names, descriptions and notes", key=f"{__file__}:search")
+        # Note edits re-index their own row, so the text index is only built once per table
+        text_index = pipeline.run('text index', lambda: TextIndex(df, SEARCH_COLUMNS), pipeline.version('working'))
+
+        df_view = pipeline.run(
+            'filter', lambda: text_index.apply(index.apply(df, selected_values), query),
+            pipeline.version('filter index'), tuple(selected_values.items()), query, text_index.generation,
+            pipeline.version('working images'),
+        )
 
         usage_options = ['Tracking', 'High Priority', 'Not Used','For Reporting']
         assign_options = ['None','AR','CE','SE','EM','AR-CE','AR-SE','AR-EM','CE-SE','CE-EM','SE-EM','AR-CE-SE','AR-CE-EM','AR-SE-EM','CE-SE-EM','ALL']
         # Calculate the number of pages after filtering
 
 
-    ROWS_PER_PAGE = 10
+        # The grid edits every filtered row in one table instead of ten cards at a time
+        view_mode = st.radio("View", ["Cards", "Grid"], horizontal=True)
+        if view_mode == "Grid":
+            clash_grid(
+                df, df_view, usage_options, f"{__file__}:grid",
+                on_usage_change=lambda: pipeline.touch('edits'), text_index=text_index, edit_log=edit_log,
+            )
+        else:
+            ROWS_PER_PAGE = 10
 
-    total_rows = len(df_view)
-    total_pages = -(-total_rows // ROWS_PER_PAGE)  # Ceiling division
+            total_rows = len(df_view)
+            total_pages = -(-total_rows // ROWS_PER_PAGE)  # Ceiling division
 
-    # Only display the slider if there's more than one page
-    if total_pages > 1:
-        selected_page = st.slider('Select a page:', 1, total_pages)
-    else:
-        selected_page = 1
+            # Only display the slider if there's more than one page
+            if total_pages > 1:
+                selected_page = st.slider('Select a page:', 1, total_pages)
+            else:
+                selected_page = 1
 
-    # Filter the dataframe based on the selected page
-    start_idx = (selected_page - 1) * ROWS_PER_PAGE
-    end_idx = start_idx + ROWS_PER_PAGE
+            # Filter the dataframe based on the selected page
+            start_idx = (selected_page - 1) * ROWS_PER_PAGE
+            end_idx = start_idx + ROWS_PER_PAGE
 
-    current_rows = df_view.iloc[start_idx:end_idx]
+            current_rows = df_view.iloc[start_idx:end_idx]
 
 
-    for idx, row in current_rows.iterrows():
+            @st.fragment
+            def clash_card(idx):
+                # Editing a note, usage or due date reruns this card alone, not the whole page;
+                # the edits go straight into df and df_view, which the pipeline keeps in the session
+                row = df_view.loc[idx]
             
-        col1, col2 = st.columns([3, 3])
+                col1, col2 = st.columns([3, 3])
         
-        with col1:
-            st.write(f"<b>{row['View Name']}</b>", unsafe_allow_html=True)
-            st.image(row['Image'], use_column_width=True)
-
-            if row['Image_Plan'] == "Image not found":
-                st.write("Plan Image not found.")
-            else:
-                st.image(row['Image_Plan'], use_column_width=True)
-
-            if row['Image_Section'] == "Image not found":
-                st.write("Section Image not found.")
-            else:
-                st.image(row['Image_Section'], use_column_width=True)
+                with col1:
+                    st.write(f"<b>{row['View Name']}</b>", unsafe_allow_html=True)
+                    st.image(row['Image'], use_column_width=True)
+
+                    if row['Image_Plan'] == "Image not found":
+                        st.write("Plan Image not found.")
+                    else:
+                        st.image(row['Image_Plan'], use_column_width=True)
+
+                    if row['Image_Section'] == "Image not found":
+                        st.write("Section Image not found.")
+                    else:
+                        st.image(row['Image_Section'], use_column_width=True)
         
-        with col2:
-            st.write(f"<b>Issue Type:</b> {row['Issues Type']}", unsafe_allow_html=True)
-            st.write(f"<b>Issue Status:</b> {row['Issues Status']}", unsafe_allow_html=True)
-            st.write(f"<b>Description:</b> {row['Description']}", unsafe_allow_html=True)
-            note_key = f"note_{row['Clash ID']}_{idx}"
-            initial_note = st.session_state.notes.get(note_key, row['Notes'])
-            note = st.text_area(f"Add a note for {row['Clash ID']}", value=initial_note, key=note_key, height=150)
-            df_view.at[idx, 'Notes'] = note
-            df.at[idx, 'Notes'] = note
-            usage_key = f"usage_{row['Clash ID']}_{idx}"
-            assign_key = f"assign_{row['Clash ID']}_{idx}"
-            initial_usage_index = usage_options.index(st.session_state.usage.get(usage_key, row['Usage'])) if st.session_state.usage.get(usage_key, row['Usage']) in usage_options else 0
-            initial_assign_index = assign_options.index(st.session_state.assign.get(assign_key, row['Assign'])) if st.session_state.assign.get(assign_key, row['Assign']) in assign_options else 0
-            usage = st.selectbox('Select usage', usage_options, index=initial_usage_index, key=usage_key)
-            assign = st.selectbox('Select assign', assign_options, index=initial_usage_index, key=assign_key)
-            df.at[idx, 'Usage'] = usage
-            df.at[idx, 'Assign'] = assign
-            #if usage == 'Not Used':
-                #df_view.at[idx, 'Issues Status'] = 'Resolved'
-                #df.at[idx, 'Issues Status'] = 'Resolved'
-
-
-
-
-            due_date_key = f"due_date_{row['Clash ID']}_{idx}"
-            initial_due_date = st.session_state.due_dates.get(due_date_key, datetime.date.today() if pd.isnull(row.get('Due Date')) else pd.to_datetime(row['Due Date']).date())
-            due_date = st.date_input(f"Select due date for {row['Clash ID']}", value=initial_due_date, key=due_date_key)
-
-            if 'Due Date' not in df.columns:
-                df['Due Date'] = None
-            df_view.at[idx, 'Due Date'] = due_date
-            df.at[idx, 'Due Date'] = due_date
-        st.markdown("---")
+                with col2:
+                    st.write(f"<b>Issue Type:</b> {row['Issues Type']}", unsafe_allow_html=True)
+                    st.write(f"<b>Issue Status:</b> {row['Issues Status']}", unsafe_allow_html=True)
+                    st.write(f"<b>Description:</b> {row['Description']}", unsafe_allow_html=True)
+                    note_key = f"note_{row['Clash ID']}_{idx}"
+                    initial_note = st.session_state.notes.get(note_key, row['Notes'])
+                    note = st.text_area(f"Add a note for {row['Clash ID']}", value=initial_note, key=note_key, height=150)
+                    df_view.at[idx, 'Notes'] = note
+                    df.at[idx, 'Notes'] = note
+                    if note != row['Notes']:
+                        # Only this row is re-indexed; the search picks the new note up on the next full run
+                        text_index.update(idx, df.loc[idx])
+                        edit_log.record('Notes', row['Clash ID'], note)
+                    usage_key = f"usage_{row['Clash ID']}_{idx}"
+                    assign_key = f"assign_{row['Clash ID']}_{idx}"
+                    initial_usage_index = usage_options.index(st.session_state.usage.get(usage_key, row['Usage'])) if st.session_state.usage.get(usage_key, row['Usage']) in usage_options else 0
+                    initial_assign_index = assign_options.index(st.session_state.assign.get(assign_key, row['Assign'])) if st.session_state.assign.get(assign_key, row['Assign']) in assign_options else 0
+                    usage = st.selectbox('Select usage', usage_options, index=initial_usage_index, key=usage_key)
+                    assign = st.selectbox('Select assign', assign_options, index=initial_usage_index, key=assign_key)
+                    if usage != row['Usage']:
+                        # Usage is a filter column, so the filter runs again
+                        pipeline.touch('edits')
+                        edit_log.record('Usage', row['Clash ID'], usage)
+                    df_view.at[idx, 'Usage'] = usage
+                    df.at[idx, 'Usage'] = usage
+                    df.at[idx, 'Assign'] = assign
+                    if assign != row['Assign']:
+                        edit_log.record('Assign', row['Clash ID'], assign)
+                    #if usage == 'Not Used':
+                        #df_view.at[idx, 'Issues Status'] = 'Resolved'
+                        #df.at[idx, 'Issues Status'] = 'Resolved'
+
+
+
+
+                    due_date_key = f"due_date_{row['Clash ID']}_{idx}"
+                    initial_due_date = st.session_state.due_dates.get(due_date_key, datetime.date.today() if pd.isnull(row.get('Due Date')) else pd.to_datetime(row['Due Date']).date())
+                    due_date = st.date_input(f"Select due date for {row['Clash ID']}", value=initial_due_date, key=due_date_key)
+
+                    if 'Due Date' not in df.columns:
+                        df['Due Date'] = None
+                    df_view.at[idx, 'Due Date'] = due_date
+                    df.at[idx, 'Due Date'] = due_date
+                    if due_date != initial_due_date:
+                        edit_log.record('Due Date', row['Clash ID'], due_date)
+                st.markdown("---")
+
+            for idx in current_rows.index:
+                clash_card(idx)
         
     if st.button("Export CSV"):
         csv_data = df_view.to_csv(encoding='utf-8-sig', index=False).encode('utf-8-sig')
@@ -797,22 +481,24 @@ if selected_option == "Option 1: Display without merging":
             )
 
     if st.button("Generate ReportA4"):
-        pdf_data = generate_pdf2(df_view, project_name)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_data,
+        st.session_state[f"{__file__}:Generate ReportA4"] = submit_report(
+            generate_pdf2, df_view, project_name,
+            quality=report_quality, max_mb=report_max_mb,
+            label="ReportA4",
+            total=len(df_view),
             file_name=f"{datetime.datetime.now().strftime('%Y%m%d')}_PDF-ClashNoteReport_{project_name}.pdf",
-            mime="application/pdf"
         )
+    show_report_job(f"{__file__}:Generate ReportA4")
 
     if st.button("Generate Report With Plan"):
-        pdf_data = generate_pdf3(df_view, project_name)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_data,
+        st.session_state[f"{__file__}:Generate Report With Plan"] = submit_report(
+            generate_pdf3, df_view, project_name,
+            quality=report_quality, max_mb=report_max_mb,
+            label="Report With Plan",
+            total=len(df_view),
             file_name=f"{datetime.datetime.now().strftime('%Y%m%d')}_PDF-ClashNoteReportWithPlan_{project_name}.pdf",
-            mime="application/pdf"
         )
+    show_report_job(f"{__file__}:Generate Report With Plan")
 
 elif selected_option == "Option 2: Display with merging":
 
@@ -822,53 +508,79 @@ elif selected_option == "Option 2: Display with merging":
     merge_option = st.checkbox("Do you want to merge the uploaded CSV with the existing data?")
 
     if not merged_df.empty and uploaded_files and merge_option:
-        df_report = pd.read_csv(report_file, encoding='utf-8-sig')
-        
-        for col in ['Notes', 'Usage', 'Date Found','Assign']:
-            if col not in df_report.columns:
-                df_report[col] = None
-            if col not in merged_df.columns:
-                merged_df[col] = None
+        def merge_tracking_report(merged_df):
+            # Works on a copy, so the resolved table kept by the pipeline stays as uploaded
+            merged_df = merged_df.copy()
+            df_report = pd.read_csv(report_file, encoding='utf-8-sig')
+
+            for col in ['Notes', 'Usage', 'Date Found','Assign']:
+                if col not in df_report.columns:
+                    df_report[col] = None
+                if col not in merged_df.columns:
+                    merged_df[col] = None
+
+
+            # Loop-based approach for merging
+            for idx, row in merged_df.iterrows():
+                match_row = df_report[df_report["Clash ID"] == row["Clash ID"]]
+                if not match_row.empty:
+                    for col in ['Notes', 'Usage', 'Due Date','Assign']:
+                        if pd.notna(match_row[col].values[0]):
+                            merged_df.at[idx, col] = match_row[col].values[0]
+            return merged_df
+
+        # The tracking report is merged once per upload, not on every rerun; new pictures reach
+        # the working table through refresh_images instead
+        merged_df = pipeline.run(
+            'report merge', lambda: merge_tracking_report(merged_df),
+            pipeline.version('merge'), uploads_key(report_file),
+        )
 
-                
-        # Loop-based approach for merging
-        for idx, row in merged_df.iterrows():
-            match_row = df_report[df_report["Clash ID"] == row["Clash ID"]]
-            if not match_row.empty:
-                for col in ['Notes', 'Usage', 'Due Date','Assign']:
-                    if pd.notna(match_row[col].values[0]):
-                        merged_df.at[idx, col] = match_row[col].values[0]
-                 
-        if 'df' not in st.session_state:
-            st.session_state.df = merged_df.copy()
-        
-        df = st.session_state.df
-        if 'Notes' not in df.columns:
-            df['Notes'] = ""
-        if 'Usage' not in df.columns:
-            df['Usage'] = "Tracking"
-        if 'Assign' not in df.columns:
-            df['Assign'] = "None"
+        def working_copy():
+            df = merged_df.copy()
+            if 'Notes' not in df.columns:
+                df['Notes'] = ""
+            if 'Usage' not in df.columns:
+                df['Usage'] = "Tracking"
+            if 'Due Date' not in df.columns:
+                # The grid can edit notes without ever setting a due date, which the reports list
+                df['Due Date'] = None
+            if 'Assign' not in df.columns:
+                df['Assign'] = "None"
+
+            df["Notes"].fillna("", inplace=True)
+            df["Usage"].fillna("Tracking", inplace=True)
+            df["Assign"].fillna("", inplace=True)
+            #df["Date Found"] = pd.to_datetime(df["Date Found"]).dt.strftime("%m/%d/%Y")
+            dates, _ = parse_dates(df["Date Found"])
+            df["Date Found"] = dates.dt.strftime("%m/%d/%Y").where(dates.notna(), df["Date Found"])
+            return edit_log.apply(df)
 
-        df["Notes"].fillna("", inplace=True)
-        df["Usage"].fillna("Tracking", inplace=True)
-        df["Assign"].fillna("", inplace=True)
-        #df["Date Found"] = pd.to_datetime(df["Date Found"]).dt.strftime("%m/%d/%Y")
-        df["Date Found"] = df["Date Found"].apply(try_parsing_date)
+        # Rebuilt when the report or the tracking report changes, with the edits carried over by edit_log
+        df = pipeline.run('working', working_copy, pipeline.version('report merge'))
+        pipeline.run('working images', lambda: refresh_images(df, pipeline.result('images'), IMAGE_COLUMNS),
+                     pipeline.version('working'), pipeline.version('images'))
 
 
         st.sidebar.header("Filter Options")
         filter_cols = ['Clash ID', 'View Name', 'Main Zone', 'Sub Zone', 'Level', 
                     'Issues Type', 'Issues Status', 'Discipline','Usage','Grid']
-        selected_values = {}
-        for col in filter_cols:
-            unique_values = df[col].unique().tolist()
-            selected_values[col] = st.sidebar.selectbox(f'Select {col}', ['All'] + unique_values)
-
-        df_view = df.copy()
-        for col, value in selected_values.items():
-            if value != 'All':
-                df_view = df_view[df_view[col] == value]
+        # Codes and bitsets of the filter columns are built once per table and usage edit;
+        # every filter combination after that is a bitwise AND, and each option shows its row count
+        index = pipeline.run(
+            'filter index', lambda: FilterIndex(df, filter_cols),
+            pipeline.version('working'), pipeline.version('edits'),
+        )
+        selected_values = filter_controls(index, f"{__file__}:filters")
+        query = st.sidebar.text_input("Search view names, descriptions and notes", key=f"{__file__}:search")
+        # Note edits re-index their own row, so the text index is only built once per table
+        text_index = pipeline.run('text index', lambda: TextIndex(df, SEARCH_COLUMNS), pipeline.version('working'))
+
+        df_view = pipeline.run(
+            'filter', lambda: text_index.apply(index.apply(df, selected_values), query),
+            pipeline.version('filter index'), tuple(selected_values.items()), query, text_index.generation,
+            pipeline.version('working images'),
+        )
 
                 
 
@@ -878,78 +590,106 @@ elif selected_option == "Option 2: Display with merging":
         # Calculate the number of pages after filtering
 
 
-    ROWS_PER_PAGE = 10
+        # The grid edits every filtered row in one table instead of ten cards at a time
+        view_mode = st.radio("View", ["Cards", "Grid"], horizontal=True)
+        if view_mode == "Grid":
+            clash_grid(
+                df, df_view, usage_options, f"{__file__}:grid",
+                on_usage_change=lambda: pipeline.touch('edits'), text_index=text_index, edit_log=edit_log,
+            )
+        else:
+            ROWS_PER_PAGE = 10
 
-    total_rows = len(df_view)
-    total_pages = -(-total_rows // ROWS_PER_PAGE)  # Ceiling division
+            total_rows = len(df_view)
+            total_pages = -(-total_rows // ROWS_PER_PAGE)  # Ceiling division
 
-    # Only display the slider if there's more than one page
-    if total_pages > 1:
-        selected_page = st.slider('Select a page:', 1, total_pages)
-    else:
-        selected_page = 1
+            # Only display the slider if there's more than one page
+            if total_pages > 1:
+                selected_page = st.slider('Select a page:', 1, total_pages)
+            else:
+                selected_page = 1
 
-    # Filter the dataframe based on the selected page
-    start_idx = (selected_page - 1) * ROWS_PER_PAGE
-    end_idx = start_idx + ROWS_PER_PAGE
+            # Filter the dataframe based on the selected page
+            start_idx = (selected_page - 1) * ROWS_PER_PAGE
+            end_idx = start_idx + ROWS_PER_PAGE
 
-    current_rows = df_view.iloc[start_idx:end_idx]
+            current_rows = df_view.iloc[start_idx:end_idx]
 
 
-    for idx, row in current_rows.iterrows():
+            @st.fragment
+            def clash_card(idx):
+                # Editing a note, usage or due date reruns this card alone, not the whole page;
+                # the edits go straight into df and df_view, which the pipeline keeps in the session
+                row = df_view.loc[idx]
             
-        col1, col2 = st.columns([3, 3])
+                col1, col2 = st.columns([3, 3])
         
-        with col1:
-            st.write(f"<b>{row['View Name']}</b>", unsafe_allow_html=True)
-            st.image(row['Image'], use_column_width=True)
+                with col1:
+                    st.write(f"<b>{row['View Name']}</b>", unsafe_allow_html=True)
+                    st.image(row['Image'], use_column_width=True)
             
-            if row['Image_Plan'] == "Image not found":
-                st.write("Plan Image not found.")
-            else:
-                st.image(row['Image_Plan'], use_column_width=True)
-
-            if row['Image_Section'] == "Image not found":
-                st.write("Section Image not found.")
-            else:
-                st.image(row['Image_Section'], use_column_width=True)
+                    if row['Image_Plan'] == "Image not found":
+                        st.write("Plan Image not found.")
+                    else:
+                        st.image(row['Image_Plan'], use_column_width=True)
+
+                    if row['Image_Section'] == "Image not found":
+                        st.write("Section Image not found.")
+                    else:
+                        st.image(row['Image_Section'], use_column_width=True)
         
-        with col2:
-            st.write(f"<b>Issue Type:</b> {row['Issues Type']}", unsafe_allow_html=True)
-            st.write(f"<b>Issue Status:</b> {row['Issues Status']}", unsafe_allow_html=True)
-            st.write(f"<b>Description:</b> {row['Description']}", unsafe_allow_html=True)
-            note_key = f"note_{row['Clash ID']}_{idx}"
-            initial_note = st.session_state.notes.get(note_key, row['Notes'])
-            note = st.text_area(f"Add a note for {row['Clash ID']}", value=initial_note, key=note_key, height=150)
-            df_view.at[idx, 'Notes'] = note
-            df.at[idx, 'Notes'] = note
-            usage_key = f"usage_{row['Clash ID']}_{idx}"
-            assign_key = f"assign_{row['Clash ID']}_{idx}"
-            initial_usage_index = usage_options.index(st.session_state.usage.get(usage_key, row['Usage'])) if st.session_state.usage.get(usage_key, row['Usage']) in usage_options else 0
-            current_assign = row['Assign'] if row['Assign'] in assign_options else "None"
-            assign_index = assign_options.index(current_assign) if current_assign in assign_options else 0
-            usage = st.selectbox('Select usage', usage_options, index=initial_usage_index, key=usage_key)
-            assign = st.selectbox('Select assign', assign_options, index=assign_index, key=assign_key)
-            df.at[idx, 'Usage'] = usage
-            df.at[idx, 'Assign'] = assign
-
-
-            #if usage == 'Not Used':
-                #df_view.at[idx, 'Issues Status'] = 'Resolved'
-                #df.at[idx, 'Issues Status'] = 'Resolved'
-
-
-
-
-            due_date_key = f"due_date_{row['Clash ID']}_{idx}"
-            initial_due_date = st.session_state.due_dates.get(due_date_key, datetime.date.today() if pd.isnull(row.get('Due Date')) else pd.to_datetime(row['Due Date']).date())
-            due_date = st.date_input(f"Select due date for {row['Clash ID']}", value=initial_due_date, key=due_date_key)
-
-            if 'Due Date' not in df.columns:
-                df['Due Date'] = None
-            df_view.at[idx, 'Due Date'] = due_date
-            df.at[idx, 'Due Date'] = due_date
-        st.markdown("---")
+                with col2:
+                    st.write(f"<b>Issue Type:</b> {row['Issues Type']}", unsafe_allow_html=True)
+                    st.write(f"<b>Issue Status:</b> {row['Issues Status']}", unsafe_allow_html=True)
+                    st.write(f"<b>Description:</b> {row['Description']}", unsafe_allow_html=True)
+                    note_key = f"note_{row['Clash ID']}_{idx}"
+                    initial_note = st.session_state.notes.get(note_key, row['Notes'])
+                    note = st.text_area(f"Add a note for {row['Clash ID']}", value=initial_note, key=note_key, height=150)
+                    df_view.at[idx, 'Notes'] = note
+                    df.at[idx, 'Notes'] = note
+                    if note != row['Notes']:
+                        # Only this row is re-indexed; the search picks the new note up on the next full run
+                        text_index.update(idx, df.loc[idx])
+                        edit_log.record('Notes', row['Clash ID'], note)
+                    usage_key = f"usage_{row['Clash ID']}_{idx}"
+                    assign_key = f"assign_{row['Clash ID']}_{idx}"
+                    initial_usage_index = usage_options.index(st.session_state.usage.get(usage_key, row['Usage'])) if st.session_state.usage.get(usage_key, row['Usage']) in usage_options else 0
+                    current_assign = row['Assign'] if row['Assign'] in assign_options else "None"
+                    assign_index = assign_options.index(current_assign) if current_assign in assign_options else 0
+                    usage = st.selectbox('Select usage', usage_options, index=initial_usage_index, key=usage_key)
+                    assign = st.selectbox('Select assign', assign_options, index=assign_index, key=assign_key)
+                    if usage != row['Usage']:
+                        # Usage is a filter column, so the filter runs again
+                        pipeline.touch('edits')
+                        edit_log.record('Usage', row['Clash ID'], usage)
+                    df_view.at[idx, 'Usage'] = usage
+                    df.at[idx, 'Usage'] = usage
+                    df.at[idx, 'Assign'] = assign
+                    if assign != row['Assign']:
+                        edit_log.record('Assign', row['Clash ID'], assign)
+
+
+                    #if usage == 'Not Used':
+                        #df_view.at[idx, 'Issues Status'] = 'Resolved'
+                        #df.at[idx, 'Issues Status'] = 'Resolved'
+
+
+
+
+                    due_date_key = f"due_date_{row['Clash ID']}_{idx}"
+                    initial_due_date = st.session_state.due_dates.get(due_date_key, datetime.date.today() if pd.isnull(row.get('Due Date')) else pd.to_datetime(row['Due Date']).date())
+                    due_date = st.date_input(f"Select due date for {row['Clash ID']}", value=initial_due_date, key=due_date_key)
+
+                    if 'Due Date' not in df.columns:
+                        df['Due Date'] = None
+                    df_view.at[idx, 'Due Date'] = due_date
+                    df.at[idx, 'Due Date'] = due_date
+                    if due_date != initial_due_date:
+                        edit_log.record('Due Date', row['Clash ID'], due_date)
+                st.markdown("---")
+
+            for idx in current_rows.index:
+                clash_card(idx)
         
     if st.button("Export CSV"):
         csv_data = df_view.to_csv(encoding='utf-8-sig', index=False).encode('utf-8-sig')
@@ -961,18 +701,20 @@ elif selected_option == "Option 2: Display with merging":
             )
 
     if st.button("Generate ReportA4"):
-        pdf_data = generate_pdf2(df_view, project_name)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_data,
+        st.session_state[f"{__file__}:Generate ReportA4"] = submit_report(
+            generate_pdf2, df_view, project_name,
+            quality=report_quality, max_mb=report_max_mb,
+            label="ReportA4",
+            total=len(df_view),
             file_name=f"{datetime.datetime.now().strftime('%Y%m%d')}_PDF-ClashNoteReport_{project_name}.pdf",
-            mime="application/pdf"
         )
+    show_report_job(f"{__file__}:Generate ReportA4")
     if st.button("Generate Report With Plan"):
-        pdf_data = generate_pdf3(df_view, project_name)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_data,
+        st.session_state[f"{__file__}:Generate Report With Plan"] = submit_report(
+            generate_pdf3, df_view, project_name,
+            quality=report_quality, max_mb=report_max_mb,
+            label="Report With Plan",
+            total=len(df_view),
             file_name=f"{datetime.datetime.now().strftime('%Y%m%d')}_PDF-ClashNoteReportWithPlan_{project_name}.pdf",
-            mime="application/pdf"
-        )
\ No newline at end of file
+        )
+    show_report_job(f"{__file__}:Generate Report With Plan")
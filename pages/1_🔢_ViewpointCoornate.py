@@ -1,6 +1,7 @@
 import streamlit as st
-import xml.etree.ElementTree as ET
+import numpy as np
 from io import BytesIO
+from utils.viewpoint_transform import read_camera_poses, affine_matrix, apply_affine, rotate_quaternions, write_camera_poses
 
 
 st.set_page_config(page_title='XML Viewpoint', page_icon=":1234:", layout='centered')
@@ -9,39 +10,19 @@ with open(css_file) as f:
     st.markdown("<style>{}</style>".format(f.read()), unsafe_allow_html=True)
 
 
-def parse_xml(file):
-    tree = ET.parse(file)
-    root = tree.getroot()
-    return root, tree
-
-def find_viewpoints_coordinates(root, old_viewpoint_name, new_viewpoint_name):
+def find_viewpoints_coordinates(view_names, positions, old_viewpoint_name, new_viewpoint_name):
+    # Exact name lookup over the positions read in one pass, no scan of every view
+    index = {name: i for i, name in enumerate(view_names)}
     coordinates = {}
-    for view in root.iter('view'):
-        name = view.get('name')
-        if old_viewpoint_name in name or new_viewpoint_name in name:
-            camera = view.find('viewpoint').find('camera')
-            position = camera.find('position').find('pos3f')
-            coordinates[name] = (
-                float(position.get('x')),
-                float(position.get('y')),
-                float(position.get('z'))
-            )
+    for name in (old_viewpoint_name, new_viewpoint_name):
+        if name in index and not np.isnan(positions[index[name]]).any():
+            coordinates[name] = tuple(positions[index[name]])
     return coordinates
 
-def adjust_view_coordinates(root, dx, dy, dz):
-    for view in root.iter('view'):
-        camera = view.find('viewpoint').find('camera')
-        position = camera.find('position').find('pos3f')
-        new_x = float(position.get('x')) + dx
-        new_y = float(position.get('y')) + dy
-        new_z = float(position.get('z')) + dz
-        position.set('x', str(new_x))
-        position.set('y', str(new_y))
-        position.set('z', str(new_z))
-    return root
-
-def xml_to_string(root):
-    return ET.tostring(root, encoding='utf-8')
+def adjust_view_coordinates(xml_file, positions, rotations, matrix, rotation):
+    new_positions = apply_affine(positions, matrix)
+    new_rotations = rotate_quaternions(rotations, rotation) if rotation else None
+    return b''.join(write_camera_poses(xml_file, new_positions, new_rotations))
 
 # Streamlit UI
 st.title("XML Viewpoint Coordinate Adjuster")
@@ -49,33 +30,56 @@ st.title("XML Viewpoint Coordinate Adjuster")
 uploaded_file = st.file_uploader("Upload XML file", type="xml")
 
 if uploaded_file is not None:
-    old_viewpoint_name = st.text_input("Enter old viewpoint name")
-    new_viewpoint_name = st.text_input("Enter new viewpoint name")
-    
-    if old_viewpoint_name and new_viewpoint_name:
-        root, tree = parse_xml(uploaded_file)
-        coordinates = find_viewpoints_coordinates(root, old_viewpoint_name, new_viewpoint_name)
-        
-        if len(coordinates) == 2:
-            old_coords = coordinates.get(old_viewpoint_name)
-            new_coords = coordinates.get(new_viewpoint_name)
-            dx = new_coords[0] - old_coords[0]
-            dy = new_coords[1] - old_coords[1]
-            dz = new_coords[2] - old_coords[2]
-            
-            st.write(f"Distance X: {dx}")
-            st.write(f"Distance Y: {dy}")
-            st.write(f"Distance Z: {dz}")
-            
-            # Adjust other views' coordinates
-            adjusted_root = adjust_view_coordinates(root, dx, dy, dz)
-            adjusted_xml = xml_to_string(adjusted_root)
-            
-            st.download_button(
-                label="Download Adjusted XML",
-                data=adjusted_xml,
-                file_name="adjusted_viewpoints.xml",
-                mime="text/xml"
-            )
-        else:
-            st.error("Unable to find the specified old and new viewpoints.")
+    view_names, positions, rotations = read_camera_poses(uploaded_file)
+    st.write(f"Views found: {len(view_names)}")
+
+    mode = st.radio("Adjust by", ["Reference viewpoints", "Survey point to project base point"])
+    matrix = None
+    rotation = 0.0
+
+    if mode == "Reference viewpoints":
+        old_viewpoint_name = st.text_input("Enter old viewpoint name")
+        new_viewpoint_name = st.text_input("Enter new viewpoint name")
+
+        if old_viewpoint_name and new_viewpoint_name:
+            coordinates = find_viewpoints_coordinates(view_names, positions, old_viewpoint_name, new_viewpoint_name)
+
+            if len(coordinates) == 2:
+                old_coords = coordinates.get(old_viewpoint_name)
+                new_coords = coordinates.get(new_viewpoint_name)
+                dx = new_coords[0] - old_coords[0]
+                dy = new_coords[1] - old_coords[1]
+                dz = new_coords[2] - old_coords[2]
+
+                st.write(f"Distance X: {dx}")
+                st.write(f"Distance Y: {dy}")
+                st.write(f"Distance Z: {dz}")
+                matrix = affine_matrix(translation=(dx, dy, dz))
+            else:
+                st.error("Unable to find the specified old and new viewpoints.")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("Survey point")
+            sx = st.number_input("Survey X", value=0.0, format="%.4f")
+            sy = st.number_input("Survey Y", value=0.0, format="%.4f")
+            sz = st.number_input("Survey Z", value=0.0, format="%.4f")
+        with col2:
+            st.write("Project base point")
+            bx = st.number_input("Base X", value=0.0, format="%.4f")
+            by = st.number_input("Base Y", value=0.0, format="%.4f")
+            bz = st.number_input("Base Z", value=0.0, format="%.4f")
+        rotation = st.number_input("Rotation about Z (degrees)", value=0.0, format="%.4f")
+        scale = st.number_input("Scale", value=1.0, min_value=0.0001, format="%.6f")
+        matrix = affine_matrix(translation=(bx - sx, by - sy, bz - sz), rotation=rotation, scale=scale, origin=(sx, sy, sz))
+
+    if matrix is not None:
+        # Adjust all views' coordinates in one step
+        adjusted_xml = adjust_view_coordinates(uploaded_file, positions, rotations, matrix, rotation)
+
+        st.download_button(
+            label="Download Adjusted XML",
+            data=adjusted_xml,
+            file_name="adjusted_viewpoints.xml",
+            mime="text/xml"
+        )
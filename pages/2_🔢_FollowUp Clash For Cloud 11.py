@@ -3,10 +3,7 @@ import pandas as pd
 from urllib.parse import unquote
 from io import BytesIO
 
-from reportlab.platypus import Table, Image, Spacer, Paragraph, PageTemplate, Frame, BaseDocTemplate
-from reportlab.platypus import (SimpleDocTemplate, Table, TableStyle, Frame, 
-                                PageTemplate, BaseDocTemplate, Image as ReportlabImage, 
-                                Paragraph, Spacer)
+from reportlab.platypus import Table, Paragraph, PageTemplate, Frame, BaseDocTemplate, Image as ReportlabImage
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, A3
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -15,14 +12,8 @@ from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.lib.enums import TA_LEFT
 from reportlab.lib.units import inch
 from PIL import Image as pil_image
-import zipfile
 import time
-from io import BytesIO
-import os
-import shutil
-import tempfile
-from bs4 import BeautifulSoup
-EXTRACTED_FLAG = False
+from utils.zip_images import ZipImageStore
 # Set up the page
 st.set_page_config(page_title='Follow Up Clash For Cloud 11', page_icon=":1234:", layout='centered')
 css_file = "styles/main.css"
@@ -33,28 +24,6 @@ pdfmetrics.registerFont(TTFont('Sarabun', r'./Font/THSarabunNew.ttf'))
 pdfmetrics.registerFont(TTFont('Sarabun-Bold', r'./Font/THSarabunNew Bold.ttf'))
 image_dict = {}
 
-def extract_images_from_zip(uploaded_zip_file):
-    extracted_images = []
-    
-    # Create a temporary directory to extract files into
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Save the uploaded file to a temporary file
-        temp_zip_path = os.path.join(tmpdirname, 'temp.zip')
-        with open(temp_zip_path, 'wb') as f:
-            f.write(uploaded_zip_file.getvalue())
-        
-        # Extract the zip file
-        shutil.unpack_archive(temp_zip_path, tmpdirname)
-
-        # Walk through the extracted files and pick up images
-        for subdir, _, files in os.walk(tmpdirname):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(subdir, file)
-                    with open(file_path, 'rb') as f:
-                        extracted_images.append((file, f.read()))
-
-    return extracted_images
 
 def extract_file_name(url):
     if isinstance(url, str):
@@ -196,9 +165,7 @@ project_name = st.text_input("Enter Project Name:", value='Cloud 11')
 csv_file = st.file_uploader("Choose a CSV file", type="csv")
 uploaded_zip = st.file_uploader("Upload Image ZIP", type=['zip'])
 if uploaded_zip:
-    zip_images = extract_images_from_zip(uploaded_zip)
-    for img_name, img_data in zip_images:
-        image_dict[img_name] = img_data
+    image_dict = ZipImageStore(uploaded_zip)
 
 
 
@@ -1,25 +1,16 @@
 import streamlit as st
 import pandas as pd
-from reportlab.platypus import Table, Image, Spacer, Paragraph, PageTemplate, Frame, BaseDocTemplate
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import landscape, A3
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.enums import TA_LEFT
-from reportlab.lib.units import inch
 from PIL import Image as pil_image
-import xml.etree.ElementTree as ET
-import zipfile
 import time
 from io import BytesIO
-import os
-import shutil
-import tempfile
-from bs4 import BeautifulSoup
-import datetime
+from utils.navisworks_html import read_view_records
+from utils.view_names import split_view_names
+from utils.dates import parse_dates, format_date
+from utils.zip_images import ZipImageStore
 
-EXTRACTED_FLAG = False
+VIEW_NAME_SCHEMA = "Clash ID_Date Found_Main Zone_Level_Description"
 
 st.set_page_config(page_title='Clash Issues Report', page_icon=":station:", layout='centered')
 
@@ -38,67 +29,21 @@ with open(css_file) as f:
 pdfmetrics.registerFont(TTFont('Sarabun', r'./Font/THSarabunNew.ttf'))
 pdfmetrics.registerFont(TTFont('Sarabun-Bold', r'./Font/THSarabunNew Bold.ttf'))
 
-def validate_date(date_str):
-    """Check if the provided date string is in the format 'YYYY-MM-DD'."""
-    try:
-        datetime.datetime.strptime(date_str, '%Y-%m-%d')
-        return True
-    except ValueError:
-        return False
-
-
-def adjust_convert_date_format(date_str):
-    # Check if the date is already in 'YYYY-MM-DD' format
-    if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
-        return date_str
-    # Adjusted function to handle the date format 'YYMMDD'
-    try:
-        formatted_date = "20" + date_str[:2] + "-" + date_str[2:4] + "-" + date_str[4:6]
-        return formatted_date  # We already have it in 'YYYY-MM-DD' format, so no need for extra conversion
-    except:
-        return "INVALID"
-
-def process_html_content(html_content):
-    soup = BeautifulSoup(html_content, 'html.parser')
-    h2_tags = soup.find_all('h2')
-    data = []
-
-    for h2 in h2_tags:
-        img = h2.find_next('img')
-        img_src = img['src'].split('/')[-1] if img else None  # Extract just the filename from the src
-        data.append((h2.text.strip(), img_src))
-
-    df = pd.DataFrame(data, columns=['View Name', 'Image'])
+def process_html_content(html_source):
+    view_records = read_view_records(html_source)
+    df = view_records
 
     df = df[~df['View Name'].str.contains('/')]
     df = df[~df['View Name'].str.startswith("____")]
 
 
-    multiple_underscores_df = df[df['View Name'].str.count('_') > 2]
-    filtered_no_asterisk_df = multiple_underscores_df[~multiple_underscores_df['View Name'].str.contains('\*')]
-    
-    split_columns = filtered_no_asterisk_df['View Name'].str.split('_', expand=True)
-    renamed_columns = {
-        0: "Clash ID",
-        1: "Date Found",
-        2: "Main Zone",
-        3: "Level",
-        4: "Description",
-    }
-    split_columns = split_columns.rename(columns=renamed_columns)
-    expanded_df = pd.concat([filtered_no_asterisk_df, split_columns], axis=1)
-
-    expanded_df['Date Found'] = expanded_df['Date Found'].apply(adjust_convert_date_format)
-    expanded_df = expanded_df[(expanded_df['Date Found'] != "INVALID") & (expanded_df['Date Found'].apply(validate_date))]
-
-    if 'Date Found' in expanded_df.columns:
-        expanded_df['Formatted Date'] = expanded_df['Date Found'].apply(adjust_convert_date_format)
-    else:
-        expanded_df['Formatted Date'] = None
+    fields, malformed_view_names = split_view_names(df['View Name'], VIEW_NAME_SCHEMA)
+    expanded_df = df.loc[fields.index].join(fields)
 
-    
+    expanded_df['Date Found'], invalid_dates = parse_dates(expanded_df['Date Found'])
+    malformed_view_names = pd.concat([malformed_view_names, expanded_df.loc[invalid_dates, 'View Name']])
 
-    filtered_date_df = expanded_df.dropna(subset=['Formatted Date'])
+    filtered_date_df = expanded_df.dropna(subset=['Date Found'])
     filtered_date_df['Issues Status'] = ""
 
     desired_order = ["Clash ID", "View Name", "Date Found", "Main Zone", "Level", 
@@ -108,39 +53,18 @@ def process_html_content(html_content):
     available_columns = [col for col in desired_order if col in filtered_date_df.columns]
     reordered_df = filtered_date_df[available_columns]
 
-    return reordered_df
+    return reordered_df, malformed_view_names
     
 
-def extract_images_from_zip(uploaded_zip_file):
-    extracted_images = []
-    
-    # Create a temporary directory to extract files into
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        # Save the uploaded file to a temporary file
-        temp_zip_path = os.path.join(tmpdirname, 'temp.zip')
-        with open(temp_zip_path, 'wb') as f:
-            f.write(uploaded_zip_file.getvalue())
-        
-        # Extract the zip file
-        shutil.unpack_archive(temp_zip_path, tmpdirname)
-
-        # Walk through the extracted files and pick up images
-        for subdir, _, files in os.walk(tmpdirname):
-            for file in files:
-                if file.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    file_path = os.path.join(subdir, file)
-                    with open(file_path, 'rb') as f:
-                        extracted_images.append((file, f.read()))
-
-    return extracted_images
 
 def main():
     st.title('Clash Report Generator (P Iff)')
     project_name = st.text_input("Enter Project Name:")
     html_file = st.file_uploader("Upload HTML File", type=['html'])
     if html_file:
-        html_content = html_file.read().decode()
-        df = process_html_content(html_content)
+        df, malformed_view_names = process_html_content(html_file)
+        if not malformed_view_names.empty:
+            st.warning(f"{len(malformed_view_names)} view names do not follow {VIEW_NAME_SCHEMA}: " + ", ".join(malformed_view_names.head(10)))
     else:
         df = pd.DataFrame()
 
@@ -168,9 +92,8 @@ def main():
     for uploaded_file in uploaded_files:
         file_type = uploaded_file.type
         if file_type in ['application/zip', 'application/x-zip-compressed']:
-            extracted_images = extract_images_from_zip(uploaded_file)
-            for img_name, img_data in extracted_images:
-                image_dict[img_name] = BytesIO(img_data)
+            # Images are indexed straight from the upload and only decompressed when a row reads them
+            image_dict.update(ZipImageStore(uploaded_file).images())
         elif file_type in ['image/jpeg', 'image/jpg', 'image/png']:
             image_dict[uploaded_file.name] = uploaded_file
         else:
@@ -205,7 +128,7 @@ def main():
                 st.image(img, use_column_width=True)
             with col2:
                 st.write(f"<b>Clash ID:</b> {row['Clash ID']}", unsafe_allow_html=True)
-                st.write(f"<b>Date Found:</b> {row['Date Found']}", unsafe_allow_html=True)
+                st.write(f"<b>Date Found:</b> {format_date(row['Date Found'], '%Y-%m-%d')}", unsafe_allow_html=True)
                 st.write(f"<b>Description:</b> {row['Description']}", unsafe_allow_html=True)
 
                 #if df.at[idx, 'Issues Status'] == 'Resolved':
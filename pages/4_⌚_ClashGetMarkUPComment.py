@@ -1,7 +1,8 @@
 import streamlit as st
-from xml.etree import ElementTree as ET
 import pandas as pd
 from io import BytesIO
+from itertools import islice
+from utils.markup_comments import iter_view_comments, comments_csv
 
 st.set_page_config(page_title='File Combiner and Transformer', page_icon=":watch:", layout='centered')
 css_file = "styles/main.css"
@@ -10,34 +11,20 @@ with open(css_file) as f:
 
 st.title('XML View Name and Comment Extractor')
 
-uploaded_file = st.file_uploader("Choose an XML file", type="xml")
+uploaded_files = st.file_uploader("Choose XML files (one per discipline model)", type="xml", accept_multiple_files=True)
 
-if uploaded_file is not None:
-    # Parse the uploaded XML file
-    tree = ET.parse(uploaded_file)
-    root = tree.getroot()
-
-    # Extract view names and comments
-    data = []
-    for view in root.findall('.//view'):
-        view_name = view.get('name')
-        rltext = view.find('.//rltext/text')
-        comment = rltext.text if rltext is not None else None
-        data.append({'View Name': view_name, 'Comment': comment})
-
-    # Create a DataFrame
-    df = pd.DataFrame(data)
-
-    # Display the first few rows of the DataFrame
-    st.write(df.head())
+if uploaded_files:
+    # Preview the first few rows of the first file without parsing the rest
+    preview = list(islice(iter_view_comments(uploaded_files[0]), 5))
+    st.write(pd.DataFrame(preview, columns=['View Name', 'Comment']))
 
     # Offer to save the data to a CSV file
     if st.button("Generate CSV"):
         filename = "transformed_data.csv"
-        csv_data = df.to_csv(encoding='utf-8-sig', index=False).encode('utf-8-sig')
+        csv_data = BytesIO(comments_csv(uploaded_files))
         st.download_button(
             label="Download CSV",
-            data=BytesIO(csv_data),
+            data=csv_data,
             file_name=filename,
             mime="text/csv"
         )
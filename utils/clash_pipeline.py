@@ -0,0 +1,261 @@
+import base64
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+from utils.pdf_images import scale_image
+from utils.zip_images import ZipImageStore
+
+ZIP_TYPES = ('application/zip', 'application/x-zip-compressed')
+IMAGE_TYPES = ('image/jpeg', 'image/jpg', 'image/png')
+MISSING_IMAGE = "Image not found"
+# Grid thumbnails, in pixels, and how many encoded ones are kept, keyed by image content
+THUMBNAIL_SIZE = (120, 80)
+THUMBNAIL_QUALITY = 60
+THUMBNAIL_CACHE_SIZE = 4096
+
+# Filter columns with more distinct values than this match on codes instead of bitsets
+BITSET_MAX_VALUES = 256
+
+_versions = itertools.count(1)
+_NAN_KEY = object()
+_thumbnails = OrderedDict()
+_thumbnails_lock = threading.Lock()
+
+
+class SessionPipeline:
+    """The stages of a clash page (ingest, parse, merge, resolve images, filter), kept between reruns.
+
+    state is a dict in st.session_state. run() remembers the inputs each stage last ran
+    with and calls the stage again only when they change. Every run or touch() gives the
+    stage a new version; passing an upstream stage's version as an input chains the
+    stages, so a new upload reruns everything after it while a filter change reruns the
+    filter alone and typing a note reruns nothing.
+    """
+
+    def __init__(self, state):
+        self._state = state
+
+    def run(self, name, fn, *inputs):
+        entry = self._state.get(name)
+        if entry is None or entry['inputs'] != inputs:
+            entry = {'inputs': inputs, 'result': fn(), 'version': next(_versions)}
+            self._state[name] = entry
+        return entry['result']
+
+    def version(self, name):
+        entry = self._state.get(name)
+        return entry['version'] if entry is not None else None
+
+    def result(self, name):
+        """What name last returned, or None if it has not run."""
+        entry = self._state.get(name)
+        return entry['result'] if entry is not None else None
+
+    def touch(self, name):
+        """Give name a new version, e.g. when an edit changes data a later stage reads."""
+        entry = self._state.setdefault(name, {'inputs': None, 'result': None, 'version': None})
+        entry['version'] = next(_versions)
+
+
+def uploads_key(*uploads):
+    """Identity of st.file_uploader values (single files or lists), cheap to check on every rerun."""
+    key = []
+    for upload in uploads:
+        files = upload if isinstance(upload, list) else [upload]
+        key.extend((f.file_id, f.name, f.size) for f in files if f is not None)
+    return tuple(key)
+
+
+def collect_images(uploaded_files):
+    """Map image file names to the uploaded images and the pictures inside uploaded ZIPs.
+
+    Returns the mapping and the types of any uploads that are neither.
+    """
+    image_dict = {}
+    unsupported = []
+    for uploaded_file in uploaded_files:
+        file_type = uploaded_file.type
+        if file_type in ZIP_TYPES:
+            # Images are indexed straight from the upload and only decompressed when a row reads them
+            image_dict.update(ZipImageStore(uploaded_file).images())
+        elif file_type in IMAGE_TYPES:
+            image_dict[uploaded_file.name] = uploaded_file
+        else:
+            unsupported.append(file_type)
+    return image_dict, unsupported
+
+
+def resolve_images(df, image_dict, columns):
+    """Copy of df with image file names replaced by the images in image_dict.
+
+    columns maps each image column to the column its file names are kept in, or None
+    to drop them; names with no image become MISSING_IMAGE.
+    """
+    df = df.copy()
+    for column, name_column in columns.items():
+        if column not in df.columns:
+            continue
+        if name_column:
+            df[name_column] = df[column]
+        df[column] = df[column].map(lambda name: image_dict.get(name, MISSING_IMAGE))
+    return df
+
+
+def refresh_images(df, source, columns):
+    """Copy the image columns of source (a resolve_images result over the same rows) into df.
+
+    columns is the mapping given to resolve_images; the file name columns are copied too.
+    df is changed in place, so a working table keeps its edits when only the pictures change.
+    """
+    for column, name_column in columns.items():
+        for col in (column, name_column):
+            if col and col in source.columns:
+                df[col] = source[col]
+    return df
+
+
+class FilterIndex:
+    """Categorical codes and per-value bitsets of a table's filter columns, built once per table.
+
+    Each column is factorized once; columns with at most BITSET_MAX_VALUES distinct
+    values also keep a packed bitset per value, so any filter combination is a
+    bitwise OR within a column and AND across columns. Higher-cardinality columns
+    (Clash ID, View Name) match on their integer codes instead of storing a bitset
+    per row. counts() gives the live row count of every option.
+    """
+
+    def __init__(self, df, columns):
+        self.columns = list(columns)
+        self._rows = len(df)
+        self._codes = {}
+        self._values = {}
+        self._positions = {}
+        self._bitsets = {}
+        for col in self.columns:
+            # NaN is kept as an option of its own, like .unique() would list it
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+            self._codes[col] = codes
+            self._values[col] = list(uniques)
+            self._positions[col] = {_option_key(value): code for code, value in enumerate(uniques)}
+            if len(uniques) <= BITSET_MAX_VALUES:
+                self._bitsets[col] = np.packbits(codes[None, :] == np.arange(len(uniques))[:, None], axis=1)
+
+    def options(self, col):
+        """Values of col in order of first appearance."""
+        return self._values[col]
+
+    def _selected_codes(self, col, values):
+        positions = self._positions[col]
+        return [positions[key] for key in map(_option_key, values) if key in positions]
+
+    def _column_bits(self, col, values):
+        codes = self._selected_codes(col, values)
+        if not codes:
+            return None
+        if col in self._bitsets:
+            return np.bitwise_or.reduce(self._bitsets[col][codes], axis=0)
+        return np.packbits(np.isin(self._codes[col], codes))
+
+    def _mask(self, selected, skip=None):
+        bits = None
+        for col, values in selected.items():
+            if col == skip or not values:
+                continue
+            column_bits = self._column_bits(col, values)
+            if column_bits is not None:
+                bits = column_bits if bits is None else bits & column_bits
+        if bits is None:
+            return None
+        return np.unpackbits(bits, count=self._rows).astype(bool)
+
+    def positions(self, selected):
+        """Row positions matching selected ({column: values}; an empty selection matches everything)."""
+        mask = self._mask(selected)
+        return np.arange(self._rows) if mask is None else np.flatnonzero(mask)
+
+    def apply(self, df, selected):
+        """Rows of df (the table the index was built from) matching selected."""
+        mask = self._mask(selected)
+        return df if mask is None else df[mask]
+
+    def counts(self, col, selected):
+        """Rows each option of col would match alongside the filters selected on the other columns."""
+        mask = self._mask(selected, skip=col)
+        codes = self._codes[col] if mask is None else self._codes[col][mask]
+        return np.bincount(codes, minlength=len(self._values[col]))
+
+
+def _option_key(value):
+    # NaN never equals itself, so it is looked up under a stand-in key
+    return _NAN_KEY if pd.isna(value) else value
+
+
+def thumbnail_uri(image, size=THUMBNAIL_SIZE):
+    """Small JPEG data URI of an image value for a grid cell, or None for a missing image.
+
+    Thumbnails are cached by content, so a picture shared by many rows, or shown again
+    after a rerun, is only scaled once.
+    """
+    if not isinstance(image, BytesIO):
+        return None
+    # ZIP members are identified from the archive index without decompressing them
+    key = image.content_id() if hasattr(image, 'content_id') else hashlib.sha1(image.getvalue()).hexdigest()
+    with _thumbnails_lock:
+        uri = _thumbnails.get(key)
+        if uri is not None:
+            _thumbnails.move_to_end(key)
+            return uri
+    jpeg = scale_image(image.getvalue(), size, THUMBNAIL_QUALITY)
+    uri = 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode('ascii')
+    with _thumbnails_lock:
+        _thumbnails[key] = uri
+        while len(_thumbnails) > THUMBNAIL_CACHE_SIZE:
+            _thumbnails.popitem(last=False)
+    return uri
+
+
+def apply_edits(df, df_view, edits):
+    """Write edits ({column: Series indexed like df_view}) into both df and df_view.
+
+    Each column is one vectorised assignment however many rows it covers.
+    """
+    for column, values in edits.items():
+        for frame in (df, df_view):
+            if column not in frame.columns:
+                frame[column] = None
+            frame.loc[values.index, column] = values
+
+
+class EditLog:
+    """Values typed into a page's working table, by column and Clash ID, kept between rebuilds.
+
+    state is a dict in st.session_state. The working table is rebuilt when its source
+    changes (a new report upload, a merged tracking report, the other display option);
+    apply() writes what was typed back into the new copy, matching rows by Clash ID.
+    """
+
+    def __init__(self, state):
+        self._state = state
+
+    def record(self, column, clash_id, value):
+        self._state.setdefault(column, {})[clash_id] = value
+
+    def record_edits(self, df, edits):
+        """Record edits ({column: Series indexed like df}), as given to apply_edits."""
+        for column, values in edits.items():
+            self._state.setdefault(column, {}).update(zip(df.loc[values.index, 'Clash ID'], values))
+
+    def apply(self, df):
+        for column, values in self._state.items():
+            if column not in df.columns:
+                df[column] = None
+            rows = df['Clash ID'].isin(list(values))
+            if rows.any():
+                df.loc[rows, column] = df.loc[rows, 'Clash ID'].map(values).astype(object)
+        return df
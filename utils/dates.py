@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+# YYMMDD, YYYYMMDD or YYYY-MM-DD, as used in view names and exported CSVs
+DATE_PATTERN = r'^(?:\d{6}|\d{8}|\d{4}-\d{2}-\d{2})$'
+# DD/MM/YYYY, as the note pages export dates and tracking reports are usually edited
+DAY_FIRST_PATTERN = r'^(\d{1,2})/(\d{1,2})/(\d{4})$'
+
+
+def parse_dates(values):
+    """Parse a Series of YYMMDD / YYYYMMDD / YYYY-MM-DD / DD/MM/YYYY values into datetime64.
+
+    to_datetime runs once over the unique values and the result is mapped back.
+    Returns the parsed Series (NaT where unparseable) and a mask of the rows that
+    had a value but could not be parsed.
+    """
+    codes, uniques = pd.factorize(values)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    # Timestamps and datetimes read back from a CSV carry a midnight time
+    text = text.str.replace(r' 00:00:00$', '', regex=True)
+    day, month, year = (part for _, part in text.str.extract(DAY_FIRST_PATTERN).items())
+    text = text.where(text.str.match(DATE_PATTERN), year + month.str.zfill(2) + day.str.zfill(2))
+    text = text.str.replace('-', '', regex=False)
+    text = text.where(text.str.len() != 6, '20' + text)
+    parsed = pd.to_datetime(text, format='%Y%m%d', errors='coerce').to_numpy(dtype='datetime64[ns]')
+
+    # Missing values have code -1, which picks the trailing NaT
+    parsed = np.append(parsed, np.datetime64('NaT', 'ns'))
+    dates = pd.Series(parsed[codes], index=values.index)
+    invalid = values.notna() & dates.isna()
+    return dates, invalid
+
+
+def format_date(value, fmt='%d/%m/%Y'):
+    """Format a single date for display, '' when missing."""
+    if pd.isnull(value):
+        return ''
+    return pd.Timestamp(value).strftime(fmt)
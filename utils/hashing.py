@@ -0,0 +1,13 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(uploaded_file, chunk_size=CHUNK_SIZE):
+    """SHA-256 of an uploaded file's bytes, read in chunks; leaves the file at position 0."""
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(chunk_size), b''):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
@@ -0,0 +1,73 @@
+import codecs
+import csv
+import hashlib
+import io
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from utils.hashing import file_digest
+from utils.report_cache import REPORT_CACHE
+
+SPOOL_SIZE = 8 * 1024 * 1024
+
+
+def iter_view_comments(xml_file):
+    """Stream a Navisworks viewpoint XML and yield (view name, first redline text) per view."""
+    if hasattr(xml_file, 'seek'):
+        xml_file.seek(0)
+    for _, view in etree.iterparse(xml_file, events=('end',), tag='view', huge_tree=True):
+        rltext = view.find('.//rltext/text')
+        yield view.get('name'), rltext.text if rltext is not None else None
+
+        view.clear()
+        parent = view.getparent()
+        if parent is not None:
+            while view.getprevious() is not None:
+                del parent[0]
+
+
+def _spool_comments(xml_file, source_name):
+    # Each file is written to its own spooled CSV so parallel workers never share a writer
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, mode='w+', encoding='utf-8', newline='')
+    writer = csv.writer(spool, lineterminator='\n')
+    for view_name, comment in iter_view_comments(xml_file):
+        writer.writerow((view_name, comment) if source_name is None else (view_name, comment, source_name))
+    spool.seek(0)
+    return spool
+
+
+def write_comments_csv(xml_files, out, max_workers=4):
+    """Write 'View Name, Comment' rows of one or more XML files to the binary stream out.
+
+    Files are parsed in parallel and appended in upload order; with more than one
+    file a 'Source File' column says which model each row came from.
+    """
+    xml_files = list(xml_files)
+    batch = len(xml_files) > 1
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    out.write(codecs.BOM_UTF8)
+    csv.writer(text, lineterminator='\n').writerow(
+        ['View Name', 'Comment', 'Source File'] if batch else ['View Name', 'Comment'])
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        spools = [executor.submit(_spool_comments, xml_file, getattr(xml_file, 'name', '') if batch else None)
+                  for xml_file in xml_files]
+        for future in spools:
+            with future.result() as spool:
+                shutil.copyfileobj(spool, text)
+    text.detach()
+    return out
+
+
+def comments_csv(xml_files):
+    """write_comments_csv as bytes, served from REPORT_CACHE when the same files were converted before."""
+    xml_files = list(xml_files)
+    key = hashlib.sha1(repr([('comments', getattr(f, 'name', ''), file_digest(f)) for f in xml_files]).encode('utf-8')).hexdigest()
+    data = REPORT_CACHE.get(key)
+    if data is None:
+        data = write_comments_csv(xml_files, io.BytesIO()).getvalue()
+        REPORT_CACHE.put(key, data)
+    return data
@@ -0,0 +1,103 @@
+import codecs
+
+import pandas as pd
+from lxml import etree
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def iter_view_records(html_content):
+    """Yield (view name, image src) for every h2 in a Navisworks HTML report, in one pass."""
+    if isinstance(html_content, str):
+        html_content = html_content.encode('utf-8')
+    parser = etree.HTMLParser(encoding='utf-8')
+    root = etree.fromstring(html_content, parser)
+    if root is None:
+        return
+
+    # Headings wait here until the next <img> in document order, same as h2.find_next('img')
+    pending = []
+    for element in root.iter('h2', 'img'):
+        if element.tag == 'h2':
+            pending.append(''.join(element.itertext()).strip())
+        elif pending:
+            src = element.get('src')
+            img_src = src.split('/')[-1] if src else None  # Extract just the filename from the src
+            for view_name in pending:
+                yield view_name, img_src
+            pending = []
+
+    for view_name in pending:
+        yield view_name, None
+
+
+def iter_view_records_stream(html_file, chunk_size=CHUNK_SIZE):
+    """Like iter_view_records, but feeds the uploaded file to lxml in chunks and drops parsed elements."""
+    if hasattr(html_file, 'seek'):
+        html_file.seek(0)
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding='utf-8')
+
+    # Each entry is [view name, image src, has image]; the name is only known at </h2>
+    pending = []
+    open_h2 = []
+
+    def drain():
+        for event, element in parser.read_events():
+            if event == 'start':
+                if element.tag == 'h2':
+                    entry = [None, None, False]
+                    pending.append(entry)
+                    open_h2.append(entry)
+                elif element.tag == 'img':
+                    src = element.get('src')
+                    img_src = src.split('/')[-1] if src else None  # Extract just the filename from the src
+                    for entry in pending:
+                        if not entry[2]:
+                            entry[1] = img_src
+                            entry[2] = True
+                continue
+
+            if element.tag == 'h2':
+                open_h2.pop()[0] = ''.join(element.itertext()).strip()
+            if open_h2:
+                # Keep the children of an open heading until its text has been read
+                continue
+            element.clear(keep_tail=True)
+            parent = element.getparent()
+            if parent is not None:
+                while element.getprevious() is not None:
+                    del parent[0]
+
+        while pending and pending[0][0] is not None and pending[0][2]:
+            view_name, img_src, _ = pending.pop(0)
+            yield view_name, img_src
+
+    first = True
+    while True:
+        chunk = html_file.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if first:
+            chunk = chunk[len(codecs.BOM_UTF8):] if chunk.startswith(codecs.BOM_UTF8) else chunk
+            first = False
+        parser.feed(chunk)
+        yield from drain()
+
+    parser.close()
+    yield from drain()
+    for view_name, img_src, _ in pending:
+        yield view_name, img_src
+
+
+def read_view_records(html_source):
+    """Return a DataFrame with 'View Name' and 'Image' for every viewpoint in the report.
+
+    Uploaded files are parsed incrementally; str/bytes content is parsed in one go.
+    """
+    if hasattr(html_source, 'read'):
+        records = iter_view_records_stream(html_source)
+    else:
+        records = iter_view_records(html_source)
+    return pd.DataFrame(list(records), columns=['View Name', 'Image'])
@@ -0,0 +1,180 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from io import BytesIO
+
+import pandas as pd
+from PIL import Image
+from reportlab.platypus import Image as ReportlabImage
+
+PDF_IMAGE_DPI = 150
+JPEG_QUALITY = 85
+# Below this many images the report workers cost more than they save
+POOL_THRESHOLD = 8
+# Scaled images kept between regenerations, keyed by (content hash, pixel size, quality)
+SCALED_CACHE_SIZE = 1024
+
+_scaled_cache = OrderedDict()
+_scaled_lock = threading.Lock()
+# reportlab writes image streams ASCII85-encoded: 5 bytes for every 4
+PDF_STREAM_OVERHEAD = 1.25
+
+
+@dataclass(frozen=True)
+class ImageQuality:
+    """How report pictures are embedded: pixel density, JPEG quality, or left out altogether."""
+    dpi: int = PDF_IMAGE_DPI
+    jpeg_quality: int = JPEG_QUALITY
+    include: bool = True
+
+
+QUALITY_PRESETS = {
+    'Draft': ImageQuality(72, 40),
+    'Standard': ImageQuality(PDF_IMAGE_DPI, JPEG_QUALITY),
+    'Print': ImageQuality(300, 92),
+    'Text only': ImageQuality(include=False),
+}
+# Set by utils.report_jobs while a report job runs: scales a list of scale_images jobs in its worker pool
+image_scaler = ContextVar('image_scaler', default=None)
+# Tried from best to smallest when a report has to fit a size budget
+QUALITY_LADDER = [
+    ImageQuality(300, 92),
+    ImageQuality(200, 88),
+    ImageQuality(150, 85),
+    ImageQuality(120, 75),
+    ImageQuality(96, 60),
+    ImageQuality(72, 40),
+    ImageQuality(60, 30),
+]
+
+
+def scale_image(image_bytes, size, quality=JPEG_QUALITY):
+    """Resize image bytes to at most size (w, h) pixels and return them as JPEG bytes."""
+    with Image.open(BytesIO(image_bytes)) as img:
+        img.draft('RGB', size)
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.getchannel('A'))
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        # Never upscale; reportlab stretches the image to the cell either way
+        target = (min(size[0], img.width), min(size[1], img.height))
+        if target != img.size:
+            img = img.resize(target, Image.LANCZOS)
+        output = BytesIO()
+        img.save(output, 'JPEG', quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def _pixel_size(width, height, dpi):
+    return max(1, round(width / 72 * dpi)), max(1, round(height / 72 * dpi))
+
+
+def scale_images(jobs):
+    """scale_image over a list of (image bytes, size, quality), the unit of work sent to a report worker."""
+    return [scale_image(image_bytes, size, quality) for image_bytes, size, quality in jobs]
+
+
+def _distinct_images(images):
+    """Digest of each BytesIO in images by id(), and the bytes of each distinct digest."""
+    digests = {}
+    sources = {}
+    for value in images:
+        if isinstance(value, BytesIO) and id(value) not in digests:
+            image_bytes = value.getvalue()
+            digest = hashlib.sha1(image_bytes).hexdigest()
+            digests[id(value)] = digest
+            sources.setdefault(digest, image_bytes)
+    return digests, sources
+
+
+def prepare_pdf_images(images, width, height, dpi=PDF_IMAGE_DPI, quality=JPEG_QUALITY):
+    """Downsample an image column to the pixel size of a width x height pt PDF slot.
+
+    BytesIO values are replaced with JPEG BytesIO at dpi; anything else (e.g. "Image not
+    found") is kept. Each distinct image is scaled once, in the report job's worker
+    processes for larger reports (see image_scaler), and reused by later calls while it
+    stays in the scaled cache.
+    """
+    size = _pixel_size(width, height, dpi)
+
+    # The same plan image is usually shared by many rows, so scale per distinct content, not per row
+    digests, sources = _distinct_images(images)
+    # Regenerating after a notes edit finds every unchanged picture already scaled
+    with _scaled_lock:
+        scaled = {key: _scaled_cache[(key, size, quality)] for key in sources if (key, size, quality) in _scaled_cache}
+    keys = [key for key in sources if key not in scaled]
+    jobs = [(sources[key], size, quality) for key in keys]
+
+    scaler = image_scaler.get()
+    if scaler is not None and len(jobs) >= POOL_THRESHOLD:
+        new = scaler(jobs)
+    else:
+        # Outside a report job this is the Streamlit server itself, which never forks workers
+        new = scale_images(jobs)
+    scaled.update(zip(keys, new))
+
+    with _scaled_lock:
+        for key in sources:
+            _scaled_cache[(key, size, quality)] = scaled[key]
+            _scaled_cache.move_to_end((key, size, quality))
+        while len(_scaled_cache) > SCALED_CACHE_SIZE:
+            _scaled_cache.popitem(last=False)
+
+    return pd.Series(
+        [BytesIO(scaled[digests[id(value)]]) if isinstance(value, BytesIO) else value for value in images],
+        index=images.index, dtype=object,
+    )
+
+
+class SharedImage(ReportlabImage):
+    """Image flowable that embeds each distinct picture once per PDF.
+
+    The bitmap is written as a form XObject named after a hash of its bytes the
+    first time it is drawn; every later row with the same content only references it.
+    """
+
+    def __init__(self, image_stream, width=None, height=None, **kwargs):
+        image_bytes = image_stream.getvalue()
+        self._form_name = 'img' + hashlib.sha1(image_bytes).hexdigest()
+        super().__init__(BytesIO(image_bytes), width=width, height=height, **kwargs)
+
+    def draw(self):
+        canvas = self.canv
+        if not canvas.hasForm(self._form_name):
+            canvas.beginForm(self._form_name, 0, 0, 1, 1)
+            canvas.drawImage(self._img, 0, 0, 1, 1, mask=self._mask)
+            canvas.endForm()
+        canvas.saveState()
+        canvas.translate(getattr(self, '_offs_x', 0), getattr(self, '_offs_y', 0))
+        canvas.scale(self.drawWidth, self.drawHeight)
+        canvas.doForm(self._form_name)
+        canvas.restoreState()
+
+
+def fit_quality(images, width, height, max_bytes, ladder=QUALITY_LADDER, sample_size=8):
+    """Best step of ladder (best first) whose pictures should fit in max_bytes of PDF.
+
+    images are the report's image values (non-BytesIO values are ignored). A sample
+    of the distinct pictures is scaled at each step, best first, and the average size
+    extrapolated to all of them; if even the smallest step does not fit, the
+    pictures are left out.
+    """
+    # Counted per distinct content, as prepare_pdf_images scales and the PDF embeds them
+    _, sources = _distinct_images(images)
+    if not sources:
+        return ladder[0]
+    # Spread the sample over the report rather than taking its first pictures
+    values = list(sources.values())
+    sample = values[::max(1, len(values) // sample_size)][:sample_size]
+
+    for quality in ladder:
+        size = _pixel_size(width, height, quality.dpi)
+        average = sum(len(scale_image(image_bytes, size, quality.jpeg_quality)) for image_bytes in sample) / len(sample)
+        if average * len(values) * PDF_STREAM_OVERHEAD <= max_bytes:
+            return quality
+    return ImageQuality(include=False)
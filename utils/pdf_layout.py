@@ -0,0 +1,952 @@
+import copy
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from io import BytesIO
+from itertools import islice
+from pathlib import Path
+
+from PIL import Image as pil_image
+from PyPDF2 import PdfReader, PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_LEFT
+from reportlab.lib.pagesizes import A3, A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import BaseDocTemplate, Flowable, Frame, PageTemplate, Paragraph, Spacer, Table, TableStyle
+
+from utils.pdf_images import ImageQuality, QUALITY_LADDER, fit_quality, prepare_pdf_images, SharedImage
+from utils.report_cache import REPORT_CACHE
+from utils.zip_images import LazyZipImage
+
+# From the repository root rather than the working directory, which spawned report workers do not share
+ROOT_DIR = Path(__file__).resolve().parent.parent
+LOGO_PATH = str(ROOT_DIR / "Media" / "1-Aurecon-logo-colour-RGB-Positive.png")
+FONTS = {
+    'Sarabun': str(ROOT_DIR / "Font" / "THSarabunNew.ttf"),
+    'Sarabun-Bold': str(ROOT_DIR / "Font" / "THSarabunNew Bold.ttf"),
+}
+DEFAULT_HEADER_COLORS = ('#4F709C', '#e2dbdc')
+# Rows turned into one Table at a time by StreamingTable
+CHUNK_ROWS = 25
+# Below this many rows per shard a worker process costs more than it saves
+SHARD_ROWS = 200
+# Text, rules and page furniture per report row, when fitting a report into a size budget
+TEXT_BYTES_PER_ROW = 2 * 1024
+# Laid-out rows kept between regenerations (see RowCache)
+ROW_CACHE_SIZE = 2000
+# Distinct field values kept parsed and wrapped (see cached_paragraph and CardGeometry.text)
+PARAGRAPH_CACHE_SIZE = 8192
+# reportlab's default left and right cell padding, which narrows the width a cell's text wraps to
+CELL_PADDING = 6
+
+
+@dataclass(frozen=True)
+class PageLayout:
+    """Where the frame, logo, project name and timestamp go on every page of a report."""
+    pagesize: tuple
+    frame: tuple
+    title_size: int
+    title_pos: tuple
+    timestamp_pos: tuple
+    timestamp_format: str = "%Y/%m/%d"
+
+    @property
+    def doc_height(self):
+        # BaseDocTemplate's default 1 inch margins, which the decorations are placed against
+        return self.pagesize[1] - 2*inch
+
+
+def _wide_layout():
+    page_width, page_height = landscape(A3)
+    doc_width, doc_height = page_width - 2*inch, page_height - 2*inch
+    return PageLayout(
+        pagesize=(page_width, page_height),
+        frame=(0.7*inch, 0.7*inch, page_width - 2*0.7*inch, page_height - 2*0.7*inch),
+        title_size=30,
+        title_pos=(doc_width/2 + 0.5*inch, doc_height + 1.2*inch + 0.25*inch),
+        timestamp_pos=(doc_width + inch, doc_height + inch + 0.75*inch),
+        timestamp_format="%Y/%m/%d %H:%M:%S",
+    )
+
+
+def _band_layout(pagesize, title_size, title_pos):
+    page_width, page_height = pagesize
+    return PageLayout(
+        pagesize=pagesize,
+        frame=(0, 0.1 * page_height, page_width, 0.8 * page_height),
+        title_size=title_size,
+        title_pos=title_pos,
+        timestamp_pos=(page_width - 0.2*inch, page_height - 0.2*inch),
+    )
+
+
+# The three report shapes used by the clash pages
+A3_WIDE = _wide_layout()
+A4_NOTE = _band_layout(A4, 26, (A4[0]/2, A4[1] - 2*inch + 1.0*inch))
+A3_PLAN = _band_layout(landscape(A3), 30, ((landscape(A3)[0] - 2*inch)/2 + 0.5*inch, landscape(A3)[1] - 2*inch + 1.0*inch + 0.25*inch))
+
+
+def register_fonts():
+    """Register the Sarabun fonts once per process; reruns skip re-reading the TTFs."""
+    registered = pdfmetrics.getRegisteredFontNames()
+    for name, path in FONTS.items():
+        if name not in registered:
+            pdfmetrics.registerFont(TTFont(name, path))
+
+
+@lru_cache(maxsize=None)
+def report_styles():
+    register_fonts()
+    normal = getSampleStyleSheet()["Normal"]
+    return {
+        'cell': ParagraphStyle("CellStyle", parent=normal, fontName="Sarabun", alignment=TA_LEFT),
+        'header': ParagraphStyle(
+            "HeaderStyle",
+            parent=normal,
+            fontName="Sarabun-Bold",
+            fontSize=18,
+            textColor=colors.white,
+            alignment=TA_LEFT,
+            spaceAfter=12,
+            leftIndent=6,
+            leading=16,
+        ),
+        'bold': ParagraphStyle("BoldStyle", parent=normal, fontName="Sarabun-Bold"),
+        'light': ParagraphStyle("LightStyle", parent=normal, fontName="Sarabun"),
+    }
+
+
+@lru_cache(maxsize=None)
+def logo_size(height=0.25*inch):
+    with pil_image.open(LOGO_PATH) as img:
+        width, img_height = img.size
+    return height * width / img_height, height
+
+
+class ReportDocTemplate(BaseDocTemplate):
+    """Doc template for a layout; an optional header table is drawn at the top of every frame."""
+
+    def __init__(self, filename, layout, project_name, header=None, timestamp=None, **kwargs):
+        BaseDocTemplate.__init__(self, filename, pagesize=layout.pagesize, **kwargs)
+        # Page decorations draw in Sarabun-Bold whichever renderer (and process) builds the doc
+        register_fonts()
+        self.layout = layout
+        self.project_name = project_name
+        self.timestamp = timestamp or time.strftime(layout.timestamp_format)
+        self.header = header
+        x, y, width, height = layout.frame
+        if header is not None:
+            # The body frame starts under the header row, which onPage draws like a repeated table row
+            _, self.header_height = header.wrap(width - 12, height)
+            height -= self.header_height
+        frame = Frame(x, y, width, height, id='F1')
+        self.addPageTemplates([PageTemplate('normal', [frame], onPage=self.add_page_decorations)])
+
+    def add_page_decorations(self, canvas, doc):
+        layout = self.layout
+        logo_width, logo_height = logo_size()
+        canvas.drawImage(LOGO_PATH, 0.2*inch, layout.doc_height + 1.5*inch, width=logo_width, height=logo_height)
+        canvas.setFont("Sarabun-Bold", layout.title_size)
+        canvas.drawCentredString(*layout.title_pos, self.project_name)
+        canvas.setFont("Sarabun-Bold", 10)
+        canvas.drawRightString(*layout.timestamp_pos, f"Generated on: {self.timestamp}")
+        if self.header is not None:
+            x, y, width, height = layout.frame
+            # Same placement Frame gives a centred flowable: 6 pt padding, centred in the rest
+            offset = 6 + 0.5 * (width - 12 - self.header._width)
+            self.header.drawOn(canvas, x + offset, y + height - 6 - self.header_height)
+
+
+class StreamingTable(Flowable):
+    """Rows fed to the frame one bounded chunk at a time.
+
+    Only the current chunk is turned into a Table, so memory and split cost stay flat
+    however many rows the iterator yields; pairs with ReportDocTemplate's page header.
+    progress, if given, is called with the number of rows in each chunk as it is laid out.
+
+    With a row_cache, rows are (key, leading cells, make_cells, make_images). image_columns
+    are the positions, after the leading cells, of the picture cells: those are never
+    cached, make_images rebuilds them from the row's scaled pictures on a cache hit.
+    """
+
+    def __init__(self, rows, col_widths, style, chunk_size=CHUNK_ROWS, row_cache=None, progress=None,
+                 image_columns=()):
+        Flowable.__init__(self)
+        self._rows = iter(rows)
+        self._col_widths = col_widths
+        self._style = style
+        self._chunk_size = chunk_size
+        self._row_cache = row_cache
+        self._progress = progress
+        self._image_columns = image_columns
+        self._pending = None
+        # Rows this table had to lay out itself, ready for RowCache.update: key -> (cells, height)
+        self.new_rows = {}
+
+    def _next_table(self):
+        if self._pending is None:
+            chunk = list(islice(self._rows, self._chunk_size))
+            if chunk and self._progress is not None:
+                self._progress(len(chunk))
+            if chunk and self._row_cache is None:
+                self._pending = Table(chunk, colWidths=self._col_widths, style=self._style)
+            elif chunk:
+                self._pending = self._cached_table(chunk)
+        return self._pending
+
+    def _cached_table(self, chunk):
+        # The leading cells (e.g. the row number) are never cached, the text cells are
+        # reused with the row's height and the pictures put back in from make_images
+        cells, heights, misses = [], [], []
+        for key, leading, make_cells, make_images in chunk:
+            entry = self._row_cache.get(key)
+            if entry is None:
+                row, height = make_cells(), None
+                misses.append((len(cells), key, len(leading)))
+            elif entry[0] is None:
+                # Only the height is known: the row was laid out in another process
+                row, height = make_cells(), entry[1]
+            else:
+                row, height = entry
+                for col, image in zip(self._image_columns, make_images()):
+                    row[col] = image
+            cells.append(leading + row)
+            heights.append(height)
+        if misses:
+            # Measure only the new rows; known heights are passed in and not re-wrapped
+            measured = Table(cells, colWidths=self._col_widths, rowHeights=heights, style=self._style)
+            measured.wrap(sum(self._col_widths), 0x7fffffff)
+            heights = measured._rowHeights
+            for index, key, n_leading in misses:
+                row = [None if col in self._image_columns else cell
+                       for col, cell in enumerate(cells[index][n_leading:])]
+                self.new_rows[key] = (row, heights[index])
+        return Table(cells, colWidths=self._col_widths, rowHeights=heights, style=self._style)
+
+    @property
+    def _ZEROSIZE(self):
+        # Once the rows run out the flowable takes no space, even in a full frame
+        return self._next_table() is None
+
+    def wrap(self, availWidth, availHeight):
+        if self._next_table() is None:
+            return 0, 0
+        # Always report "too tall" so the frame asks split() for the next piece
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        table = self._next_table()
+        if table is None:
+            return []
+        # The doc template only retries a postponed flowable once; this one is reused
+        # page after page, so forget the mark whenever it makes progress
+        self.__dict__.pop('_postponed', None)
+        _, height = table.wrap(availWidth, availHeight)
+        if height <= availHeight:
+            self._pending = None
+            return [table, self]
+        parts = table.split(availWidth, availHeight)
+        if not parts:
+            # Not even one row fits; the same chunk is retried in the next frame
+            return []
+        self._pending = parts[-1]
+        return parts[:-1] + [self]
+
+    def draw(self):
+        pass
+
+
+def _copy_cells(cells):
+    if cells is None:
+        return None
+    return [
+        [copy.copy(flowable) for flowable in cell] if isinstance(cell, list)
+        else copy.copy(cell) if isinstance(cell, Flowable) else cell
+        for cell in cells
+    ]
+
+
+class RowCache:
+    """Bounded LRU of laid-out table rows, keyed by a hash of everything the row shows.
+
+    Regenerating a report after editing a few notes only builds and measures the rows
+    whose key changed. Entries are (cells, height): the text cells only, with None where
+    a picture goes, since decoded pictures are far bigger than the text and the scaled
+    JPEGs they come from are cached already. cells is None when only the height is known,
+    for rows laid out in another process (see row_heights). Cells are handed out as
+    shallow copies, so concurrent builds never draw the same flowable instance.
+    """
+
+    def __init__(self, maxsize=ROW_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is None:
+                return None
+            self._rows.move_to_end(key)
+        cells, height = entry
+        return _copy_cells(cells), height
+
+    def update(self, rows):
+        with self._lock:
+            for key, entry in rows.items():
+                # A height alone never replaces cells already built for the same key
+                if entry[0] is not None or key not in self._rows:
+                    self._rows[key] = entry
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def heights(self, keys):
+        """The known heights of keys, as entries for another process's RowCache.update."""
+        with self._lock:
+            return {key: (None, self._rows[key][1]) for key in keys if key in self._rows}
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+ROW_CACHE = RowCache()
+
+
+def row_heights(rows):
+    """New rows (key -> (cells, height)) as sent back from another process: heights only."""
+    return {key: (None, height) for key, (_, height) in rows.items()}
+
+
+def _fingerprint(value):
+    if isinstance(value, LazyZipImage):
+        return value.content_id()
+    if isinstance(value, BytesIO):
+        return hashlib.sha1(value.getvalue()).hexdigest()
+    if isinstance(value, (list, tuple)):
+        return tuple(_fingerprint(item) for item in value)
+    return repr(value)
+
+
+def row_key(*parts):
+    """Content hash of report rows; images are hashed by their bytes, everything else by repr."""
+    return hashlib.sha1(repr(_fingerprint(parts)).encode('utf-8')).hexdigest()
+
+
+class PrewrappedParagraph(Paragraph):
+    """Paragraph that remembers its last wrap, so measuring it again at the same width is free.
+
+    Tables wrap every cell once to size the row and again to draw it.
+    """
+    _wrapped = None
+
+    def wrap(self, availWidth, availHeight):
+        if self._wrapped is None or self._wrapped[0] != availWidth:
+            self._wrapped = availWidth, super().wrap(availWidth, availHeight)
+        return self._wrapped[1]
+
+
+@lru_cache(maxsize=PARAGRAPH_CACHE_SIZE)
+def _wrapped_paragraph(text, style, width):
+    paragraph = PrewrappedParagraph(text, style)
+    paragraph.wrap(width, 72000)
+    return paragraph
+
+
+def cached_paragraph(text, style, width):
+    """Paragraph of text in style, already broken into lines for width.
+
+    Fields such as Level, Group or Issues Status take a handful of values across thousands
+    of rows; each distinct (text, style, width) is parsed and measured once per process.
+    Callers get a shallow copy, as from RowCache, so no two cells draw the same instance.
+    """
+    return copy.copy(_wrapped_paragraph(text, style, width))
+
+
+def _table_styles(header_colors):
+    background, text = header_colors
+    cell_style = report_styles()['cell']
+    header = [
+        ('BACKGROUND', (0, 0), (-1, 0), background),
+        ('TEXTCOLOR', (0, 0), (-1, 0), text),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Sarabun'),
+        ('FONTSIZE', (0, 0), (-1, 0), 16),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('STYLE', (0, 0), (-1, -1), cell_style),
+    ]
+    body = [
+        ('BACKGROUND', (0, 0), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTNAME', (0, 0), (-1, -1), 'Sarabun'),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('STYLE', (0, 0), (-1, -1), cell_style),
+    ]
+    return header, body
+
+
+@lru_cache(maxsize=None)
+def _details_table_styles(header_colors):
+    background, text = header_colors
+    header = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), background),
+        ('TEXTCOLOR', (0, 0), (-1, 0), text),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Sarabun-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 18),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('GRID', (0, 0), (-1, -1), 1, '#2B2B2B'),
+        ('FONTSIZE', (0, 0), (0, -1), 16)
+    ])
+    body = TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('BACKGROUND', (0, 0), (-1, -1), '#ffffff'),
+        ('GRID', (0, 0), (-1, -1), 1, '#2B2B2B'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Sarabun'),
+        ('FONTSIZE', (1, 0), (1, -1), 16),
+        ('FONTSIZE', (0, 0), (0, -1), 16)
+    ])
+    return header, body
+
+
+def _image_cell(value, size, missing_text):
+    if isinstance(value, BytesIO):
+        return SharedImage(value, width=size, height=size)
+    # None marks a picture left out of a text-only report
+    return missing_text if value is not None else ''
+
+
+def resolve_quality(quality, max_mb, images, image_size, n_rows):
+    """The ImageQuality to build with: quality as given, or the best one no better than it
+    that keeps the report under max_mb.
+    """
+    quality = quality or ImageQuality()
+    if not max_mb or not quality.include:
+        return quality
+    budget = max_mb * 1024 * 1024 - n_rows * TEXT_BYTES_PER_ROW
+    ladder = [step for step in QUALITY_LADDER if step.dpi <= quality.dpi] or QUALITY_LADDER[-1:]
+    return fit_quality(images, image_size, image_size, budget, ladder) if budget > 0 else ImageQuality(include=False)
+
+
+def _prepare_images(values, image_size, quality):
+    if not quality.include:
+        return [None] * len(values)
+    return prepare_pdf_images(values, image_size, image_size, dpi=quality.dpi, quality=quality.jpeg_quality).tolist()
+
+
+def merge_pdfs(parts):
+    """Concatenate PDF documents (bytes) page by page, in the order given."""
+    writer = PdfWriter()
+    for part in parts:
+        for page in PdfReader(BytesIO(part)).pages:
+            writer.add_page(page)
+    output = BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _shard_bounds(n_rows, max_workers=None):
+    shards = max(1, min(max_workers or os.cpu_count() or 1, n_rows // SHARD_ROWS))
+    step = math.ceil(n_rows / shards) if n_rows else 1
+    return [(start, min(start + step, n_rows)) for start in range(0, n_rows, step)] or [(0, 0)]
+
+
+def _render_shard(render, records, start, **spec):
+    pdf, new_rows = render(records, start, **spec)
+    return pdf, row_heights(new_rows)
+
+
+def render_shards(render, records, max_workers=None, **spec):
+    """Run render(records, start, **spec) over shards of records and merge the PDFs.
+
+    render returns (PDF bytes, new rows for ROW_CACHE). Each shard is laid out in its
+    own process; start is the 1-based number of the shard's first row, so row
+    numbering carries on across shards. Small reports render in-process as a single
+    shard. records and spec must be picklable. Returns (PDF bytes, new rows); rows
+    laid out in shard processes come back as heights only.
+
+    Shards are separate documents, so a picture shared by rows in several shards is
+    embedded once per shard and merge_pdfs keeps every copy. Sharding trades that file
+    size for layout time; report jobs always lay out a single shard (see
+    utils.report_jobs), so only direct multi-shard calls pay it.
+    """
+    bounds = _shard_bounds(len(records), max_workers)
+    if len(bounds) == 1:
+        return render(records, 1, **spec)
+    with ProcessPoolExecutor(max_workers=len(bounds)) as executor:
+        futures = [executor.submit(_render_shard, render, records[start:end], start + 1, **spec)
+                   for start, end in bounds]
+        results = [future.result() for future in futures]
+    new_rows = {}
+    for _, rows in results:
+        new_rows.update(rows)
+    return merge_pdfs([pdf for pdf, _ in results]), new_rows
+
+
+# Set by utils.report_jobs while a page's report runs as a background job
+report_runner = ContextVar('report_runner', default=None)
+
+
+def render_sharded(render, records, max_workers=None, **spec):
+    """Render a report with render_shards here, or hand it to the report job in progress."""
+    runner = report_runner.get()
+    if runner is not None:
+        return runner(render, records, max_workers, spec)
+    pdf, new_rows = render_shards(render, records, max_workers, **spec)
+    # Workers lay rows out in their own copy of the cache; keep them in ours for the next run
+    ROW_CACHE.update(new_rows)
+    return pdf
+
+
+def _render_table(records, start, project_name, timestamp, columns, col_widths, header_colors, image_size, progress=None):
+    styles = report_styles()
+
+    image_columns = [index for index, col in enumerate(columns) if col == 'Image']
+
+    def make_cells(record):
+        return [
+            _image_cell(value, image_size, 'Image not found') if col == 'Image'
+            else cached_paragraph(str(value), styles['cell'], width - 2*CELL_PADDING)
+            for col, width, value in zip(columns, col_widths, record)
+        ]
+
+    def make_images(record):
+        return [_image_cell(record[index], image_size, 'Image not found') for index in image_columns]
+
+    def rows():
+        for key, record in records:
+            yield key, [], partial(make_cells, record), partial(make_images, record)
+
+    header_style, body_style = _table_styles(header_colors)
+    header = Table([[Paragraph(col, styles['header']) for col in columns]], colWidths=col_widths, style=header_style)
+    table = StreamingTable(rows(), col_widths, body_style, row_cache=ROW_CACHE, progress=progress,
+                           image_columns=image_columns)
+    output = BytesIO()
+    pdf = ReportDocTemplate(output, A3_WIDE, project_name, header=header, timestamp=timestamp)
+    pdf.build([table])
+    return output.getvalue(), table.new_rows
+
+
+def report_key(*parts):
+    """REPORT_CACHE key of a report built from parts, today.
+
+    The day is part of the key, so a cached report never shows an earlier date in its
+    "Generated on" line. A3-wide reports also print the time of day: a hit later the
+    same day shows the time the report was first built.
+    """
+    return row_key('report', time.strftime('%Y/%m/%d'), *parts)
+
+
+def build_table_pdf(df, project_name, columns, col_widths, header_colors=DEFAULT_HEADER_COLORS, image_size=150,
+                    max_workers=None, quality=None, max_mb=None):
+    """A3-wide report as PDF bytes: one row per clash, one cell per column, the 'Image' column as a picture.
+
+    quality (an ImageQuality, e.g. from QUALITY_PRESETS) and max_mb control how the
+    pictures are embedded (see resolve_quality). Finished reports are kept in
+    REPORT_CACHE, keyed by their rows, layout, quality, project name and day (see report_key).
+    """
+    context = ('table', columns, col_widths, image_size, quality, max_mb)
+    rows = list(df[columns].itertuples(index=False, name=None))
+    # The same rows, layout and project always give the same report, whoever asks for it
+    report = report_key(context, project_name, header_colors, rows)
+    pdf = REPORT_CACHE.get(report)
+    if pdf is not None:
+        return pdf
+
+    quality = resolve_quality(quality, max_mb, df['Image'], image_size, len(df))
+    images = _prepare_images(df['Image'], image_size, quality)
+    image_index = columns.index('Image')
+    records = []
+    for row, image in zip(rows, images):
+        record = row[:image_index] + (image,) + row[image_index + 1:]
+        records.append((row_key(context, record), record))
+    pdf = render_sharded(
+        _render_table, records, max_workers,
+        project_name=project_name, timestamp=time.strftime(A3_WIDE.timestamp_format), columns=columns,
+        col_widths=col_widths, header_colors=header_colors, image_size=image_size,
+    )
+    REPORT_CACHE.put(report, pdf)
+    return pdf
+
+
+@dataclass(frozen=True)
+class ImageSlot:
+    header: str
+    column: str
+    missing_text: str = "Image Not Found"
+
+
+def detail_paragraphs(label, value, width):
+    styles = report_styles()
+    return [cached_paragraph(f"{label}:", styles['bold'], width), cached_paragraph(str(value).strip(), styles['light'], width)]
+
+
+def note_paragraphs(notes, width):
+    if not notes:
+        return [Spacer(1, 0.1*inch)]
+    light = report_styles()['light']
+    return [cached_paragraph(line, light, width) for line in notes.splitlines()]
+
+
+class CardGeometry:
+    """Column positions and cell styles of a card report's body, worked out once per report.
+
+    The cell styles come from the same body TableStyle the Table renderer uses, so fonts,
+    paddings and alignment stay in step; ClashCard only has to measure its text.
+    """
+
+    def __init__(self, col_widths, body_style):
+        self.col_widths = col_widths
+        self.width = sum(col_widths)
+        self.col_positions = [sum(col_widths[:col]) for col in range(len(col_widths))]
+        self.cell_styles = Table([[''] * len(col_widths)], colWidths=col_widths, style=body_style)._cellStyles[0]
+        self.line_width, self.line_color = next(
+            (cmd[3], colors.toColor(cmd[4])) for cmd in body_style.getCommands() if cmd[0] == 'GRID'
+        )
+        self.background = next(colors.toColor(cmd[3]) for cmd in body_style.getCommands() if cmd[0] == 'BACKGROUND')
+
+    def text_width(self, col):
+        style = self.cell_styles[col]
+        return self.col_widths[col] - style.leftPadding - style.rightPadding
+
+    def text(self, text, col, style):
+        """A text block for column col: (lines, style), each line (text, extra space, spaces),
+        broken exactly as a Paragraph would break it.
+
+        Markup, entities, non-breaking or soft hyphen characters and words too long for the
+        column need Paragraph's own handling, so those come back as a Paragraph instead.
+        """
+        width = self.text_width(col)
+        lines = _break_text(text, style, width)
+        if lines is None:
+            return cached_paragraph(text, style, width)
+        return lines, style
+
+    def height(self, cells):
+        height = 0
+        for col, value in enumerate(cells):
+            style = self.cell_styles[col]
+            if isinstance(value, list):
+                content = sum(_block_height(block, self.text_width(col)) for block in value)
+            elif isinstance(value, SharedImage):
+                content = value.drawHeight
+            else:
+                content = len(value.split('\n')) * style.leading
+            height = max(height, content + style.topPadding + style.bottomPadding)
+        return height
+
+
+@lru_cache(maxsize=PARAGRAPH_CACHE_SIZE)
+def _break_text(text, style, width):
+    # Paragraph's line breaking for plain single-font text; None where only Paragraph gets it right
+    if any(char in text for char in '<>&\xa0\xad'):
+        return None
+    font, size = style.fontName, style.fontSize
+    space = pdfmetrics.stringWidth(' ', font, size)
+    shrink = style.spaceShrinkage * space
+    lines = []
+    line, line_width = [], -space
+    for word in text.split():
+        word_width = pdfmetrics.stringWidth(word, font, size)
+        if word_width > width:
+            return None
+        new_width = line_width + space + word_width
+        if new_width <= width + shrink * len(line) or not line:
+            line.append(word)
+            line_width = new_width
+        else:
+            lines.append((' '.join(line), width - line_width, len(line) - 1))
+            line, line_width = [word], word_width
+    if line:
+        lines.append((' '.join(line), width - line_width, len(line) - 1))
+    return tuple(lines)
+
+
+def _block_height(block, width):
+    if isinstance(block, Paragraph):
+        return block.wrap(width, 72000)[1]
+    if isinstance(block, tuple):
+        lines, style = block
+        return len(lines) * style.leading
+    return block
+
+
+class ClashCard(Flowable):
+    """One row of a card report, drawn straight onto the canvas.
+
+    cells holds, per column, a string, a SharedImage or a list of blocks: spacer heights,
+    text blocks from CardGeometry.text or Paragraphs. The result matches the Table
+    renderer's output, without building a Table or parsing a Paragraph per field.
+    height, if known (e.g. from the row cache), saves measuring the cells again.
+    """
+
+    def __init__(self, geometry, cells, height=None):
+        super().__init__()
+        self.geometry = geometry
+        self.cells = cells
+        self.hAlign = 'CENTER'
+        self.width = geometry.width
+        self.height = geometry.height(cells) if height is None else height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        canvas = self.canv
+        geometry = self.geometry
+        canvas.setFillColor(geometry.background)
+        canvas.rect(0, 0, self.width, self.height, stroke=0, fill=1)
+
+        for col, value in enumerate(self.cells):
+            style = geometry.cell_styles[col]
+            x, col_width = geometry.col_positions[col], geometry.col_widths[col]
+            top = self.height - style.topPadding
+            canvas.setFillColor(style.color)
+            if isinstance(value, SharedImage):
+                value.drawOn(canvas, x + (col_width + style.leftPadding - style.rightPadding - value.drawWidth) / 2,
+                             top - value.drawHeight)
+            elif isinstance(value, list):
+                self._draw_blocks(value, x + style.leftPadding, top, geometry.text_width(col))
+            else:
+                canvas.setFont(style.fontname, style.fontsize, style.leading)
+                y = top - style.fontsize
+                for line in value.split('\n'):
+                    canvas.drawCentredString(x + (col_width + style.leftPadding - style.rightPadding) / 2, y, line)
+                    y -= style.leading
+
+        # Grid last, over the cell contents, as Table draws it
+        canvas.setStrokeColor(geometry.line_color)
+        canvas.setLineWidth(geometry.line_width)
+        canvas.setLineCap(1)
+        canvas.setLineJoin(1)
+        canvas.rect(0, 0, self.width, self.height, stroke=1, fill=0)
+        for x in geometry.col_positions[1:]:
+            canvas.line(x, 0, x, self.height)
+
+    def _draw_blocks(self, blocks, x, top, width):
+        canvas = self.canv
+        for block in blocks:
+            if isinstance(block, Paragraph):
+                height = block.wrap(width, 72000)[1]
+                block.drawOn(canvas, x, top - height)
+            elif isinstance(block, tuple):
+                lines, style = block
+                height = len(lines) * style.leading
+                text = canvas.beginText(x, top - style.fontSize)
+                text.setFont(style.fontName, style.fontSize, style.leading)
+                for line, extra, spaces in lines:
+                    # A line squeezed into the column by space shrinkage, as Paragraph draws it
+                    if extra < -1e-8 and spaces:
+                        text.setWordSpace(extra / spaces)
+                        text.textLine(line)
+                        text.setWordSpace(0)
+                    else:
+                        text.textLine(line)
+                canvas.drawText(text)
+            else:
+                height = block
+            top -= height
+
+
+class StreamingCards(Flowable):
+    """ClashCards fed to the frame from an iterator, one bounded chunk at a time.
+
+    StreamingTable's counterpart for card reports: cards are built only as the frame
+    asks for them, so a report never holds more than a chunk of cards at once.
+    progress, if given, is called with the number of cards in each chunk as it is taken.
+    """
+
+    def __init__(self, cards, chunk_size=CHUNK_ROWS, progress=None):
+        Flowable.__init__(self)
+        self._cards = iter(cards)
+        self._chunk_size = chunk_size
+        self._progress = progress
+        self._pending = deque()
+
+    def _next_card(self):
+        if not self._pending:
+            self._pending.extend(islice(self._cards, self._chunk_size))
+            if self._pending and self._progress is not None:
+                self._progress(len(self._pending))
+        return self._pending[0] if self._pending else None
+
+    @property
+    def _ZEROSIZE(self):
+        # Once the cards run out the flowable takes no space, even in a full frame
+        return self._next_card() is None
+
+    def wrap(self, availWidth, availHeight):
+        if self._next_card() is None:
+            return 0, 0
+        # Always report "too tall" so the frame asks split() for the next cards
+        return availWidth, availHeight + 1
+
+    def split(self, availWidth, availHeight):
+        cards, used = [], 0
+        card = self._next_card()
+        while card is not None and used + card.wrap(availWidth, availHeight)[1] <= availHeight:
+            used += card.height
+            cards.append(self._pending.popleft())
+            card = self._next_card()
+        if not cards:
+            # Not even one card fits; it is retried in the next frame, and a card taller
+            # than a whole frame fails there as any unsplittable flowable does
+            return []
+        # The doc template only retries a postponed flowable once; forget the mark on progress
+        self.__dict__.pop('_postponed', None)
+        return cards + [self] if card is not None else cards
+
+    def draw(self):
+        pass
+
+
+def _render_details(records, start, project_name, timestamp, layout, images, header, col_widths, image_size,
+                    header_colors, notes, progress=None):
+    details_width = col_widths[1 + len(images)] - 2*CELL_PADDING
+
+    def make_images(image_values, detail_values, note):
+        return [_image_cell(value, image_size, slot.missing_text) for slot, value in zip(images, image_values)]
+
+    def make_cells(image_values, detail_values, note):
+        cells = make_images(image_values, detail_values, note)
+
+        details_list = []
+        for label, value in detail_values:
+            details_list += detail_paragraphs(label, value, details_width)
+        details_list.append(Spacer(1, 0.1*inch))
+        cells.append(details_list)
+
+        if notes:
+            cells.append(note_paragraphs(note, col_widths[2 + len(images)] - 2*CELL_PADDING))
+        return cells
+
+    def rows():
+        # The No. cell is filled in per build, so inserting a clash does not invalidate the rows after it
+        for idx, (key, record) in enumerate(records, start):
+            yield key, [str(idx)], partial(make_cells, *record), partial(make_images, *record)
+
+    header_style, body_style = _details_table_styles(header_colors)
+    table = StreamingTable(rows(), col_widths, body_style, row_cache=ROW_CACHE, progress=progress,
+                           image_columns=range(len(images)))
+    output = BytesIO()
+    pdf = ReportDocTemplate(output, layout, project_name, header=Table([header], colWidths=col_widths, style=header_style),
+                            timestamp=timestamp)
+    pdf.build([table])
+    return output.getvalue(), table.new_rows
+
+
+def _render_cards(records, start, project_name, timestamp, layout, images, header, col_widths, image_size,
+                  header_colors, notes, progress=None):
+    # Same report as _render_details, with every row a ClashCard instead of a Table row
+    styles = report_styles()
+    header_style, body_style = _details_table_styles(header_colors)
+    geometry = CardGeometry(col_widths, body_style)
+    details_col = 1 + len(images)
+    new_rows = {}
+
+    def make_text(detail_values, note):
+        details_list = []
+        for label, value in detail_values:
+            details_list.append(geometry.text(f"{label}:", details_col, styles['bold']))
+            details_list.append(geometry.text(str(value).strip(), details_col, styles['light']))
+        details_list.append(0.1*inch)
+        cells = [details_list]
+
+        if notes:
+            if note:
+                cells.append([geometry.text(line, details_col + 1, styles['light']) for line in note.splitlines()])
+            else:
+                cells.append([0.1*inch])
+        return cells
+
+    def cards():
+        # Cached entries hold the text cells after the No. and picture cells, as for StreamingTable
+        for idx, (key, (image_values, detail_values, note)) in enumerate(records, start):
+            pictures = [_image_cell(value, image_size, slot.missing_text) for slot, value in zip(images, image_values)]
+            entry = ROW_CACHE.get(key)
+            if entry is not None and entry[0] is not None:
+                text, height = entry[0][len(images):], entry[1]
+            else:
+                text, height = make_text(detail_values, note), entry and entry[1]
+            card = ClashCard(geometry, [str(idx)] + pictures + text, height)
+            if entry is None:
+                new_rows[key] = ([None] * len(images) + text, card.height)
+            yield card
+
+    output = BytesIO()
+    pdf = ReportDocTemplate(output, layout, project_name, header=Table([header], colWidths=col_widths, style=header_style),
+                            timestamp=timestamp)
+    pdf.build([StreamingCards(cards(), progress=progress)])
+    return output.getvalue(), new_rows
+
+
+RENDERERS = {
+    'cards': _render_cards,
+    'table': _render_details,
+}
+
+
+def build_details_pdf(df, project_name, layout, images, details, col_widths, image_size,
+                      header_colors=DEFAULT_HEADER_COLORS, notes=True, max_workers=None, quality=None, max_mb=None,
+                      renderer='cards'):
+    """Card-style report as PDF bytes: No., one picture per ImageSlot, a details column and (optionally) notes.
+
+    details is a list of (label, column) or (label, column, formatter) tuples; col_widths
+    are fractions of the layout's portrait page width. quality and max_mb work as in
+    build_table_pdf. Large reports are rendered in shards across max_workers processes
+    (see render_sharded) and kept in REPORT_CACHE.
+
+    renderer picks how rows are laid out (see RENDERERS): 'cards' draws each fixed-geometry
+    row straight onto the canvas; 'table' goes through reportlab Tables. Both stream
+    their rows and reuse laid-out rows through the row cache.
+    """
+    page_width = min(layout.pagesize)
+    col_widths = [fraction * page_width for fraction in col_widths]
+    # The layout is part of the key: A4_NOTE and A3_PLAN reports can share rows and column fractions
+    context = ('details', layout, images, col_widths, image_size, notes, quality, max_mb, renderer)
+    # Formatters usually live in the page script, so apply them here and ship plain values to the workers
+    rows = [
+        (
+            [row[slot.column] for slot in images],
+            [(label, formatter[0](row[column]) if formatter else row[column]) for label, column, *formatter in details],
+            row['Notes'] if notes else None,
+        )
+        for _, row in df.iterrows()
+    ]
+    report = report_key(context, project_name, header_colors, rows)
+    pdf = REPORT_CACHE.get(report)
+    if pdf is not None:
+        return pdf
+
+    columns = {slot.column for slot in images}
+    quality = resolve_quality(quality, max_mb, [value for column in columns for value in df[column]], image_size, len(df))
+    scaled = {column: _prepare_images(df[column], image_size, quality) for column in columns}
+    records = []
+    for index, (_, detail_values, note) in enumerate(rows):
+        record = ([scaled[slot.column][index] for slot in images], detail_values, note)
+        records.append((row_key(context, record), record))
+    pdf = render_sharded(
+        RENDERERS[renderer], records, max_workers,
+        project_name=project_name, timestamp=time.strftime(layout.timestamp_format), layout=layout, images=images,
+        header=["No."] + [slot.header for slot in images] + ["Details"] + (["Note"] if notes else []),
+        col_widths=col_widths, image_size=image_size,
+        header_colors=header_colors, notes=notes,
+    )
+    REPORT_CACHE.put(report, pdf)
+    return pdf
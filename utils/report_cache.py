@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+REPORT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'clash-report-cache')
+REPORT_CACHE_MB = 512
+
+
+class ReportCache:
+    """Generated reports on disk, one file per content key, shared by every session and worker.
+
+    Files are written atomically, so concurrent builds of the same report are harmless;
+    once the directory passes max_bytes the least recently read files are removed.
+    """
+
+    def __init__(self, directory=REPORT_CACHE_DIR, max_bytes=REPORT_CACHE_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # The modification time doubles as the last-used time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        # A cache that cannot be written only costs a rebuild, never the report itself
+        tmp_path = None
+        try:
+            # Reports carry project data; other users of a shared temp directory may not read them
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+            self._evict()
+        except OSError:
+            pass
+        finally:
+            # A failed write (e.g. a full disk) must not leave its partial file behind;
+            # _evict never counts .tmp files, so nothing else would remove it
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _evict(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+REPORT_CACHE = ReportCache()
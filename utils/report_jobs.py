@@ -0,0 +1,182 @@
+import itertools
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+
+import pandas as pd
+
+from utils.pdf_images import image_scaler, scale_images
+from utils.pdf_layout import ROW_CACHE, register_fonts, render_shards, report_runner, row_heights
+
+# Reports laid out at once; each gets a fresh process that exits when its job ends.
+# Pictures are scaled in a second pool of as many processes, kept between batches
+REPORT_WORKERS = 2
+# Jobs whose data preparation (formatting, cache lookups) may run at once in the server process
+JOB_THREADS = 8
+
+_lock = threading.Lock()
+_pool = None
+# Progress queue of _pool, read by its _collect_progress thread until None is put on it
+_collector_queue = None
+_scale_pool = None
+_threads = ThreadPoolExecutor(max_workers=JOB_THREADS, thread_name_prefix='report-job')
+_jobs = {}
+_job_ids = itertools.count(1)
+# In worker processes: where row progress is sent, set by _init_worker
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+    # A spawned worker starts with no fonts registered; styles shipped from the page name them
+    register_fonts()
+
+
+def _report_progress(job_id, rows):
+    _progress_queue.put((job_id, rows))
+
+
+def _render_job(job_id, render, records, known_heights, spec):
+    # Runs in a worker process, which starts with an empty row cache. Only row heights
+    # cross the process boundary either way: cells are rebuilt here, never pickled.
+    # One shard: the job already holds one of the REPORT_WORKERS processes, and sharding
+    # here would start a nested pool of cpu_count() more
+    ROW_CACHE.update(known_heights)
+    pdf, new_rows = render_shards(render, records, 1, progress=partial(_report_progress, job_id), **spec)
+    return pdf, row_heights(new_rows)
+
+
+def _collect_progress(progress_queue):
+    for job_id, rows in iter(progress_queue.get, None):
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.rows_done += rows
+
+
+def _get_pool():
+    global _pool, _collector_queue
+    with _lock:
+        if _pool is None:
+            # spawn, not fork: workers must not inherit the Streamlit server's threads and memory
+            context = multiprocessing.get_context('spawn')
+            _collector_queue = context.Queue()
+            threading.Thread(target=_collect_progress, args=(_collector_queue,), daemon=True).start()
+            _pool = ProcessPoolExecutor(
+                max_workers=REPORT_WORKERS, mp_context=context, max_tasks_per_child=1,
+                initializer=_init_worker, initargs=(_collector_queue,),
+            )
+        return _pool
+
+
+def _get_scale_pool():
+    global _scale_pool
+    with _lock:
+        if _scale_pool is None:
+            # Scaling keeps nothing between batches, so unlike _pool its workers are not recycled
+            _scale_pool = ProcessPoolExecutor(max_workers=REPORT_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _scale_pool
+
+
+def _discard_pool(pool):
+    # A worker of pool died (e.g. out of memory); the next job starts a new one
+    global _pool, _collector_queue, _scale_pool
+    with _lock:
+        if pool is _pool:
+            _pool = None
+            _collector_queue.put(None)
+            _collector_queue = None
+        elif pool is _scale_pool:
+            _scale_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ReportJob:
+    """A report requested from a page: rows laid out so far and the Future of its result."""
+
+    def __init__(self, label, total, file_name, mime, download_label):
+        self.id = next(_job_ids)
+        self.label = label
+        self.total = total
+        self.file_name = file_name
+        self.mime = mime
+        self.download_label = download_label
+        self.rows_done = 0
+        self.future = None
+
+    @property
+    def progress(self):
+        return min(1.0, self.rows_done / self.total) if self.total else 0.0
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        return self.future.result()
+
+    def exception(self):
+        return self.future.exception()
+
+    def render(self, render, records, max_workers, spec):
+        """report_runner for this job: lay the rows out in a worker process.
+
+        max_workers is not used: each job is laid out as a single shard in its worker.
+        """
+        known = ROW_CACHE.heights(key for key, _ in records)
+        pool = _get_pool()
+        try:
+            future = pool.submit(_render_job, self.id, render, records, known, spec)
+            pdf, new_rows = future.result()
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        ROW_CACHE.update(new_rows)
+        return pdf
+
+    def scale(self, jobs):
+        """image_scaler for this job: scale pictures in the scaling pool, in at most REPORT_WORKERS batches."""
+        size = math.ceil(len(jobs) / REPORT_WORKERS)
+        pool = _get_scale_pool()
+        try:
+            futures = [pool.submit(scale_images, jobs[i:i + size]) for i in range(0, len(jobs), size)]
+            return [image for future in futures for image in future.result()]
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+
+
+def _snapshot(value):
+    return value.copy() if isinstance(value, pd.DataFrame) else value
+
+
+def _run(job, fn, args, kwargs):
+    runner_token = report_runner.set(job.render)
+    scaler_token = image_scaler.set(job.scale)
+    try:
+        result = fn(*args, **kwargs)
+        job.rows_done = job.total
+        return result
+    finally:
+        image_scaler.reset(scaler_token)
+        report_runner.reset(runner_token)
+        _jobs.pop(job.id, None)
+
+
+def submit_report(fn, *args, label="Report", total=0, file_name="report.pdf", mime="application/pdf",
+                  download_label="Download PDF Report", **kwargs):
+    """Queue fn(*args, **kwargs) as a background job and return its ReportJob at once.
+
+    fn runs on a job thread; any build_table_pdf / build_details_pdf call inside it is
+    laid out, and its pictures scaled, in pools of REPORT_WORKERS spawned processes,
+    reporting progress per row out of total. Anything else fn returns (e.g. CSV bytes) is simply produced off the script thread.
+    DataFrame arguments are copied first, so edits the page makes while the job runs do not reach the report.
+    """
+    args = tuple(_snapshot(arg) for arg in args)
+    kwargs = {name: _snapshot(value) for name, value in kwargs.items()}
+    job = ReportJob(label, total, file_name, mime, download_label)
+    _jobs[job.id] = job
+    job.future = _threads.submit(_run, job, fn, args, kwargs)
+    return job
@@ -0,0 +1,167 @@
+import datetime
+
+import pandas as pd
+import streamlit as st
+
+from utils.clash_pipeline import apply_edits, thumbnail_uri
+from utils.pdf_images import QUALITY_PRESETS
+
+# Rows sent to the browser at a time by the clash grid
+GRID_ROWS = 200
+GRID_EDIT_COLUMNS = ['Notes', 'Usage', 'Due Date']
+
+
+@st.fragment(run_every=1)
+def _report_job_progress(job):
+    # Only this fragment reruns while the job builds, so the rest of the page stays usable
+    st.progress(job.progress, text=f"{job.label}: {job.rows_done}/{job.total} rows")
+    if job.done():
+        st.rerun()
+
+
+def show_report_job(key):
+    """Show the progress, error or download button of the ReportJob stored at st.session_state[key]."""
+    job = st.session_state.get(key)
+    if job is None:
+        return
+    if not job.done():
+        _report_job_progress(job)
+    elif job.exception() is not None:
+        st.error(f"{job.label} failed: {job.exception()}")
+    else:
+        st.download_button(
+            label=job.download_label,
+            data=job.result(),
+            file_name=job.file_name,
+            mime=job.mime,
+            key=f"{key}_download",
+        )
+
+
+def report_quality_controls():
+    """Sidebar picker for the picture quality and size budget of every report built on the page."""
+    st.sidebar.header("Report Quality")
+    presets = list(QUALITY_PRESETS)
+    preset = st.sidebar.selectbox("PDF quality", presets, index=presets.index("Standard"))
+    max_mb = st.sidebar.number_input("Max PDF size in MB (0 = no limit)", min_value=0, value=0, step=5)
+    return QUALITY_PRESETS[preset], max_mb or None
+
+
+def filter_controls(index, key, container=st.sidebar, label="Select {}"):
+    """A multiselect per column of a FilterIndex, each option labelled with its live row count.
+
+    Returns {column: tuple of selected values}; a column left empty is not filtered.
+    """
+    keys = {col: f"{key}:{col}" for col in index.columns}
+    # The counts of one column depend on the selections in all the others, so read them all first
+    selected = {col: tuple(st.session_state.get(keys[col], ())) for col in index.columns}
+    for col in index.columns:
+        options = index.options(col)
+        counts = index.counts(col, selected)
+        labels = {value: f"{value} ({count})" for value, count in zip(options, counts)}
+        selected[col] = tuple(container.multiselect(
+            label.format(col), options, key=keys[col],
+            format_func=lambda value, labels=labels: labels.get(value, str(value)),
+        ))
+    return selected
+
+
+def _grid_dates(rows):
+    if 'Due Date' not in rows.columns:
+        return pd.Series(pd.NaT, index=rows.index, dtype='datetime64[ns]')
+    return pd.to_datetime(rows['Due Date'], errors='coerce')
+
+
+def _with_usage_side_effects(edits, when_not_used):
+    # Marking a clash 'Not Used' also sets the columns the cards set, e.g. Issues Status
+    usage = edits.get('Usage')
+    if usage is not None and when_not_used:
+        unused = usage.index[usage == 'Not Used']
+        for column, value in when_not_used.items():
+            if len(unused):
+                edits[column] = pd.Series(value, index=unused)
+    return edits
+
+
+def clash_grid(df, df_view, usage_options, key, on_usage_change=None, text_index=None, when_not_used=None,
+               edit_log=None):
+    """Editable table of the filtered clashes, the alternative to the paged clash cards.
+
+    Shows Clash ID, View Name, a thumbnail, Notes, Usage and Due Date. Only a window of
+    GRID_ROWS rows is built and sent to the browser; bulk actions set Usage or Due Date
+    on every row of df_view at once. Edits are written into both df and df_view.
+    on_usage_change is called when Usage changes, since it is a filter column;
+    text_index, a TextIndex over df, has the rows with edited notes re-indexed;
+    when_not_used maps columns to the values they take when a row becomes 'Not Used';
+    edit_log, an EditLog, records every edit so it survives a rebuild of df.
+    """
+    generation_key = f"{key}:generation"
+    generation = st.session_state.setdefault(generation_key, 0)
+
+    def commit(edits, restart):
+        edits = _with_usage_side_effects(edits, when_not_used)
+        apply_edits(df, df_view, edits)
+        if edit_log is not None:
+            edit_log.record_edits(df, edits)
+        if text_index is not None:
+            for label in set().union(*(edits[col].index for col in edits if col in text_index.columns)):
+                text_index.update(label, df.loc[label])
+        if 'Usage' in edits and on_usage_change is not None:
+            on_usage_change()
+        if restart:
+            # Start the editor afresh; its pending cell edits refer to rows by position
+            st.session_state[generation_key] = generation + 1
+            st.rerun()
+
+    with st.expander(f"Bulk edit all {len(df_view)} filtered rows"):
+        col1, col2 = st.columns(2)
+        with col1:
+            bulk_usage = st.selectbox('Set usage to', usage_options, key=f"{key}:bulk_usage")
+            if st.button('Apply usage to filtered rows', key=f"{key}:bulk_usage_apply"):
+                commit({'Usage': pd.Series(bulk_usage, index=df_view.index)}, restart=True)
+        with col2:
+            bulk_date = st.date_input('Set due date to', value=datetime.date.today(), key=f"{key}:bulk_date")
+            if st.button('Apply due date to filtered rows', key=f"{key}:bulk_date_apply"):
+                commit({'Due Date': pd.Series([bulk_date] * len(df_view), index=df_view.index, dtype=object)}, restart=True)
+
+    total_windows = -(-len(df_view) // GRID_ROWS)
+    if total_windows > 1:
+        window = st.slider(f'Select rows ({GRID_ROWS} at a time):', 1, total_windows, key=f"{key}:window")
+    else:
+        window = 1
+    rows = df_view.iloc[(window - 1) * GRID_ROWS:window * GRID_ROWS]
+
+    grid = pd.DataFrame({
+        'Clash ID': rows['Clash ID'],
+        'View Name': rows['View Name'],
+        'Thumbnail': [thumbnail_uri(image) for image in rows['Image']],
+        'Notes': rows['Notes'] if 'Notes' in rows.columns else "",
+        'Usage': rows['Usage'] if 'Usage' in rows.columns else "Tracking",
+        'Due Date': _grid_dates(rows),
+    }, index=rows.index)
+    edited = st.data_editor(
+        grid,
+        column_config={
+            'Thumbnail': st.column_config.ImageColumn('Thumbnail'),
+            'Notes': st.column_config.TextColumn('Notes', width='large'),
+            'Usage': st.column_config.SelectboxColumn('Usage', options=usage_options, required=True),
+            'Due Date': st.column_config.DateColumn('Due Date', format='DD/MM/YYYY'),
+        },
+        disabled=['Clash ID', 'View Name', 'Thumbnail'],
+        hide_index=True,
+        use_container_width=True,
+        key=f"{key}:editor:{generation}:{window}",
+    )
+
+    edits = {}
+    for column in GRID_EDIT_COLUMNS:
+        before, after = grid[column], edited[column]
+        changed = ~((before == after) | (before.isna() & after.isna()))
+        if changed.any():
+            edits[column] = after[changed]
+    if 'Due Date' in edits:
+        # Stored as dates, the same as the cards' date inputs
+        edits['Due Date'] = pd.Series(list(edits['Due Date'].dt.date), index=edits['Due Date'].index, dtype=object)
+    if edits:
+        # A usage change can move rows in or out of the filter, so the grid restarts from the new view
+        commit(edits, restart='Usage' in edits)
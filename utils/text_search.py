@@ -0,0 +1,121 @@
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+
+import pandas as pd
+
+SEARCH_COLUMNS = ['View Name', 'Description', 'Discipline', 'Location', 'Notes']
+NGRAM = 3
+
+# Letters and digits of any script, plus the whole Thai block: Thai vowel and tone marks
+# are combining characters, which \w alone would split words on
+_TOKEN = re.compile(r'(?:[^\W_]|[฀-๿])+')
+# Zero-width spaces often mark Thai word breaks in pasted text; Thai digits search as 0-9
+_NORMALIZE = str.maketrans({'​': ' ', **{chr(0x0E50 + d): str(d) for d in range(10)}})
+
+
+def tokenize(text):
+    """Casefolded tokens of text, split on anything that is not a letter, digit or Thai character.
+
+    Thai is written without spaces between words, so a run of Thai stays one token;
+    TextIndex finds words inside it by substring.
+    """
+    text = unicodedata.normalize('NFC', str(text)).translate(_NORMALIZE).casefold()
+    return _TOKEN.findall(text)
+
+
+def _ngrams(token):
+    return {token[i:i + NGRAM] for i in range(len(token) - NGRAM + 1)}
+
+
+class TextIndex:
+    """Inverted index over the text columns of a clash table, for substring and prefix search.
+
+    Rows are indexed under their tokens, and tokens under their character trigrams, so
+    a substring anywhere in a word (or in a run of Thai) is found by intersecting a
+    few trigram sets instead of scanning the rows. A query term ending in * matches
+    token prefixes through a sorted vocabulary. update() re-indexes a single row after
+    an edit and bumps generation, which callers can use as a cache key.
+    """
+
+    def __init__(self, df, columns=SEARCH_COLUMNS):
+        self.columns = [col for col in columns if col in df.columns]
+        self.generation = 0
+        self._row_tokens = {}
+        self._postings = defaultdict(set)
+        self._ngrams = defaultdict(set)
+        for label, values in zip(df.index, df[self.columns].itertuples(index=False)):
+            self._add(label, values)
+        self._vocabulary = sorted(self._postings)
+
+    def _row_text(self, values):
+        tokens = set()
+        for value in values:
+            if not pd.isna(value):
+                tokens.update(tokenize(value))
+        return tokens
+
+    def _add(self, label, values):
+        tokens = self._row_text(values)
+        self._row_tokens[label] = tokens
+        new = []
+        for token in tokens:
+            if token not in self._postings:
+                new.append(token)
+                for gram in _ngrams(token):
+                    self._ngrams[gram].add(token)
+            self._postings[token].add(label)
+        return new
+
+    def _remove(self, label):
+        for token in self._row_tokens.pop(label, ()):
+            rows = self._postings[token]
+            rows.discard(label)
+            if not rows:
+                del self._postings[token]
+                for gram in _ngrams(token):
+                    self._ngrams[gram].discard(token)
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    def update(self, label, row):
+        """Re-index one row (a Series or mapping holding the indexed columns) after an edit."""
+        self._remove(label)
+        for token in self._add(label, [row.get(col) for col in self.columns]):
+            bisect.insort(self._vocabulary, token)
+        self.generation += 1
+
+    def _tokens_containing(self, term):
+        grams = _ngrams(term)
+        if not grams:
+            # Too short for a trigram; the vocabulary is small next to the rows
+            return [token for token in self._vocabulary if term in token]
+        candidates = set.intersection(*(self._ngrams.get(gram, set()) for gram in grams))
+        return [token for token in candidates if term in token]
+
+    def _tokens_starting(self, prefix):
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        end = bisect.bisect_left(self._vocabulary, prefix + '\U0010ffff', start)
+        return self._vocabulary[start:end]
+
+    def search(self, query):
+        """Labels of the rows matching every term of query, or None for an empty query.
+
+        A term matches rows with a token containing it; a term ending in * only
+        matches tokens starting with it.
+        """
+        matches = None
+        for term in query.split():
+            prefix = term.endswith('*')
+            for part in tokenize(term):
+                tokens = self._tokens_starting(part) if prefix else self._tokens_containing(part)
+                rows = set().union(*(self._postings[token] for token in tokens))
+                matches = rows if matches is None else matches & rows
+                if not matches:
+                    return set()
+        return matches
+
+    def apply(self, df, query):
+        """Rows of df (the indexed table or a subset of it) matching query."""
+        matches = self.search(query)
+        return df if matches is None else df[df.index.isin(list(matches))]
@@ -0,0 +1,40 @@
+import re
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def compile_view_name_schema(schema, min_fields=4, exclude='*'):
+    """Compile a schema such as 'Clash ID_Date Found_Level_Description' into one regex.
+
+    The first min_fields parts are required, the rest are optional; names containing
+    any character of exclude do not match. Extra trailing parts are ignored.
+    """
+    field_names = schema.split('_')
+    part = '[^_' + re.escape(exclude) + ']*' if exclude else '[^_]*'
+    tail = '(?:_' + ('[^' + re.escape(exclude) + ']*' if exclude else '.*') + ')?'
+
+    total = max(len(field_names), min_fields)
+    pattern = tail
+    for i in reversed(range(total)):
+        group = f'(?P<f{i}>{part})' if i < len(field_names) else part
+        sep = '_' if i else ''
+        pattern = sep + group + pattern
+        if i >= min_fields:
+            pattern = '(?:' + pattern + ')?'
+    return field_names, re.compile('(?s)^' + pattern + '$')
+
+
+def split_view_names(view_names, schema, min_fields=4, exclude='*'):
+    """Split a Series of view names into the schema's fields in a single vectorized pass.
+
+    Returns the fields of every matching name (indexed like view_names) and the
+    matching names that are missing one or more schema fields.
+    """
+    field_names, pattern = compile_view_name_schema(schema, min_fields, exclude)
+    fields = view_names.str.extract(pattern)
+    fields.columns = field_names
+
+    matched = fields[field_names[0]].notna()
+    fields = fields[matched]
+    malformed = view_names[matched & fields[field_names[-1]].reindex(view_names.index).isna()]
+    return fields, malformed
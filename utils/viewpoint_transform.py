@@ -0,0 +1,174 @@
+import html
+import math
+import re
+
+import numpy as np
+
+CHUNK_SIZE = 1024 * 1024
+
+# One XML token starting at '<': a comment, CDATA section, processing instruction, doctype or tag.
+# Attribute values are matched whole, so a '>' inside quotes, a comment or CDATA never ends a tag
+_TOKEN = re.compile(
+    rb'<!--.*?-->'
+    rb'|<!\[CDATA\[.*?\]\]>'
+    rb'|<\?.*?\?>'
+    rb'|<!(?:[^>\["\']|"[^"]*"|\'[^\']*\'|\[.*?\])*>'
+    rb'|<(?P<closing>/?)(?P<tag>[^\s/>!?]+)'
+    rb'(?P<attrs>(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*)(?P<self_closing>/?)>',
+    re.S,
+)
+_ATTR = re.compile(rb'(\s([a-z]+)\s*=\s*)(["\'])(.*?)\3', re.S)
+_CAMERA_PATH = {
+    b'pos3f': [b'view', b'viewpoint', b'camera', b'position'],
+    b'quaternion': [b'view', b'viewpoint', b'camera', b'rotation'],
+}
+POSITION_ATTRS = (b'x', b'y', b'z')
+ROTATION_ATTRS = (b'a', b'b', b'c', b'd')
+
+
+def _iter_tokens(xml_file, chunk_size):
+    """Yield (chunk, tag matches) for the raw XML, read chunk_size bytes at a time.
+
+    Each chunk ends after its last complete token, so no tag, comment or CDATA section
+    is split between two chunks; malformed XML raises ValueError.
+    """
+    if hasattr(xml_file, 'seek'):
+        xml_file.seek(0)
+    carry = b''
+    offset = 0
+    while True:
+        data = xml_file.read(chunk_size)
+        buffer = carry + data
+        matches = []
+        pos = 0
+        while True:
+            start = buffer.find(b'<', pos)
+            if start < 0:
+                pos = len(buffer)
+                break
+            match = _TOKEN.match(buffer, start)
+            if match is None:
+                if not data:
+                    raise ValueError(f"Malformed XML at byte {offset + start}")
+                # The token runs on into the next read
+                pos = start
+                break
+            if match.group('tag') is not None:
+                matches.append(match)
+            pos = match.end()
+        if pos:
+            yield buffer[:pos], matches
+        carry = buffer[pos:]
+        offset += pos
+        if not data:
+            break
+
+
+def _iter_camera_tags(xml_file, chunk_size):
+    """Yield (chunk, tags) for the raw XML, where tags lists the view and camera tags found in the chunk.
+
+    Each tag is (tag name, view index, view name, attribute span, attribute bytes).
+    """
+    stack = []
+    view_index = -1
+    view_name = None
+    for chunk, matches in _iter_tokens(xml_file, chunk_size):
+        tags = []
+        for match in matches:
+            tag, attrs = match.group('tag'), match.group('attrs')
+            if match.group('closing'):
+                if stack and stack[-1] == tag:
+                    stack.pop()
+                continue
+            if tag == b'view':
+                view_index += 1
+                names = dict((m.group(2), m.group(4)) for m in _ATTR.finditer(attrs))
+                view_name = html.unescape(names[b'name'].decode('utf-8')) if b'name' in names else None
+                tags.append((tag, view_index, view_name, match.span('attrs'), attrs))
+            elif tag in _CAMERA_PATH and stack[-4:] == _CAMERA_PATH[tag]:
+                tags.append((tag, view_index, view_name, match.span('attrs'), attrs))
+            if not match.group('self_closing'):
+                stack.append(tag)
+        yield chunk, tags
+
+
+def read_camera_poses(xml_file, chunk_size=CHUNK_SIZE):
+    """Read every view's camera position and rotation quaternion into NumPy arrays.
+
+    Returns (view names, positions (n, 3), rotations (n, 4) as a, b, c, d); views
+    without a camera get NaN rows.
+    """
+    names = []
+    positions = []
+    rotations = []
+    for _, tags in _iter_camera_tags(xml_file, chunk_size):
+        for tag, view_index, view_name, _, attrs in tags:
+            if tag == b'view':
+                names.append(view_name)
+                positions.append([math.nan] * 3)
+                rotations.append([math.nan] * 4)
+                continue
+            values = dict((m.group(2), m.group(4)) for m in _ATTR.finditer(attrs))
+            if tag == b'pos3f':
+                positions[view_index] = [float(values.get(k, 'nan')) for k in POSITION_ATTRS]
+            else:
+                rotations[view_index] = [float(values.get(k, 'nan')) for k in ROTATION_ATTRS]
+    return names, np.array(positions, dtype=float).reshape(-1, 3), np.array(rotations, dtype=float).reshape(-1, 4)
+
+
+def affine_matrix(translation=(0.0, 0.0, 0.0), rotation=0.0, scale=1.0, origin=(0.0, 0.0, 0.0)):
+    """4x4 matrix that scales and rotates (degrees, about Z) around origin, then translates."""
+    origin = np.asarray(origin, dtype=float)
+    angle = math.radians(rotation)
+    linear = scale * np.array([
+        [math.cos(angle), -math.sin(angle), 0.0],
+        [math.sin(angle), math.cos(angle), 0.0],
+        [0.0, 0.0, 1.0],
+    ])
+    matrix = np.eye(4)
+    matrix[:3, :3] = linear
+    matrix[:3, 3] = origin - linear @ origin + np.asarray(translation, dtype=float)
+    return matrix
+
+
+def apply_affine(positions, matrix):
+    """Transform an (n, 3) array of points in one operation."""
+    return positions @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def rotate_quaternions(rotations, rotation):
+    """Turn (n, 4) camera quaternions (a, b, c vector part, d scalar) by rotation degrees about Z."""
+    half = math.radians(rotation) / 2
+    sz, cz = math.sin(half), math.cos(half)
+    a, b, c, d = rotations.T
+    return np.column_stack([cz * a - sz * b, cz * b + sz * a, cz * c + sz * d, cz * d - sz * c])
+
+
+def write_camera_poses(xml_file, positions, rotations=None, chunk_size=CHUNK_SIZE):
+    """Yield the XML again as byte chunks with only the camera position (and rotation) values replaced.
+
+    positions and rotations are indexed by view, as returned by read_camera_poses.
+    """
+    for chunk, tags in _iter_camera_tags(xml_file, chunk_size):
+        if not tags:
+            yield chunk
+            continue
+        parts = []
+        last = 0
+        for tag, view_index, _, (start, end), attrs in tags:
+            if tag == b'pos3f':
+                keys, values = POSITION_ATTRS, positions[view_index]
+            elif tag == b'quaternion' and rotations is not None:
+                keys, values = ROTATION_ATTRS, rotations[view_index]
+            else:
+                continue
+            new_values = dict(zip(keys, values))
+            parts.append(chunk[last:start])
+            parts.append(_ATTR.sub(
+                lambda m: m.group(1) + m.group(3) + str(float(new_values[m.group(2)])).encode() + m.group(3)
+                if m.group(2) in new_values else m.group(0),
+                attrs,
+            ))
+            last = end
+        parts.append(chunk[last:])
+        yield b''.join(parts)
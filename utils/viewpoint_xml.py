@@ -0,0 +1,39 @@
+from lxml import etree
+
+
+def iter_view_folders(xml_file):
+    """Stream a Navisworks viewpoint XML and yield (view name, folder names) for every view.
+
+    Folder names are the 'name' of each ancestor, unnamed elements repeating their
+    parent's name, as the old stack walk did. The list is one shared stack that is
+    updated in place; copy it if it has to outlive the iteration step.
+    """
+    if hasattr(xml_file, 'seek'):
+        xml_file.seek(0)
+    folder_names = []
+    view_depth = 0
+
+    for event, element in etree.iterparse(xml_file, events=('start', 'end'), huge_tree=True):
+        if event == 'start':
+            if view_depth:
+                view_depth += 1
+            elif element.tag == 'view':
+                view_depth = 1
+                yield element.get('name'), folder_names
+            else:
+                folder_names.append(element.get('name', folder_names[-1] if folder_names else None))
+            continue
+
+        if view_depth:
+            view_depth -= 1
+            if view_depth:
+                # Camera, redline and clip data inside the view are dropped with it
+                continue
+        else:
+            folder_names.pop()
+
+        element.clear()
+        parent = element.getparent()
+        if parent is not None:
+            while element.getprevious() is not None:
+                del parent[0]
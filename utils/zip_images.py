@@ -0,0 +1,130 @@
+import zipfile
+from functools import lru_cache
+from io import BytesIO, UnsupportedOperation
+
+from utils.hashing import file_digest
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+CACHE_SIZE = 64
+
+
+class LazyZipImage(BytesIO):
+    """Read-only file object over one image in a ZIP.
+
+    Nothing is kept in the object itself: every read is served from the store's small
+    LRU of decompressed members, so holding thousands of these (e.g. in image_dict in
+    session state) keeps at most the store's cache_size images in memory.
+    """
+
+    def __init__(self, store, name):
+        super().__init__()
+        self.name = name
+        self._store = store
+        self._pos = 0
+
+    def _data(self):
+        return self._store.read(self.name)
+
+    def content_id(self):
+        """Identify the image by the upload's SHA-256 and its ZIP entry's CRC-32 and size,
+        without decompressing it; CRC-32 and size alone can collide across uploads.
+        """
+        info = self._store.info(self.name)
+        return f"zip:{self._store.digest}:{info.CRC:08x}:{info.file_size}"
+
+    def getvalue(self):
+        return self._data()
+
+    def getbuffer(self):
+        return memoryview(self._data())
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += self._store.info(self.name).file_size
+        if offset < 0:
+            raise ValueError(f"negative seek value {offset}")
+        self._pos = offset
+        return offset
+
+    def read(self, size=-1):
+        data = self._data()
+        end = len(data) if size is None or size < 0 else self._pos + size
+        chunk = data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    read1 = read
+
+    def readinto(self, buffer):
+        chunk = self.read(len(buffer))
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+    readinto1 = readinto
+
+    def readline(self, size=-1):
+        data = self._data()
+        end = data.find(b'\n', self._pos) + 1 or len(data)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        chunk = data[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def write(self, data):
+        raise UnsupportedOperation("LazyZipImage is read-only")
+
+    def truncate(self, size=None):
+        raise UnsupportedOperation("LazyZipImage is read-only")
+
+
+class ZipImageStore:
+    """Images in an uploaded ZIP, indexed by file name without extracting anything."""
+
+    def __init__(self, zip_source, cache_size=CACHE_SIZE):
+        # Part of every LazyZipImage.content_id, which keys cached rows and reports
+        self.digest = file_digest(zip_source)
+        self._zip = zipfile.ZipFile(zip_source)
+        self._members = {}
+        for info in self._zip.infolist():
+            file_name = info.filename.replace('\\', '/').rsplit('/', 1)[-1]
+            if not info.is_dir() and file_name.lower().endswith(IMAGE_EXTENSIONS):
+                self._members[file_name] = info
+        # Small LRU of decompressed bytes, shared by every LazyZipImage of this store
+        self.read = lru_cache(maxsize=cache_size)(self._read)
+
+    def _read(self, name):
+        return self._zip.read(self._members[name])
+
+    def info(self, name):
+        return self._members[name]
+
+    def __getitem__(self, name):
+        return self.read(name)
+
+    def __contains__(self, name):
+        return name in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def images(self):
+        """Map every image file name to a LazyZipImage, ready to merge into image_dict."""
+        return {name: LazyZipImage(self, name) for name in self._members}